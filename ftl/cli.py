@@ -178,6 +178,23 @@ def snapshots_clean(last_n, delete_all, project_only, yes):
     console.print(f"[bold green]Done. {len(targets)} snapshot(s) removed.[/bold green]")
 
 
+@snapshots.command("migrate")
+def snapshots_migrate():
+    """Rename old-format S3 snapshot keys so listing skips a HEAD per snapshot."""
+    from ftl.snapshot import create_snapshot_store
+
+    console = Console()
+    config_path = find_config()
+    store = create_snapshot_store(load_config() if config_path else None)
+    migrate = getattr(store, "migrate_legacy_keys", None)
+    if migrate is None:
+        console.print("[dim]Only S3 snapshots have legacy keys; nothing to migrate.[/dim]")
+        return
+
+    moved = migrate()
+    console.print(f"[bold green]Done. {moved} snapshot key(s) migrated.[/bold green]")
+
+
 @main.command()
 @click.option("-n", "--limit", default=20, help="Number of log entries to show.")
 @click.option("--all", "show_all", is_flag=True, help="Show logs for all projects.")
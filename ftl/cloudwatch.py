@@ -30,14 +30,16 @@ def init(log_group, log_stream):
     """Initialize the CloudWatch singleton for a session.
 
     Must be called once per session before any emit() calls.
-    No-ops if log_group is empty or boto3 is unavailable.
+    No-ops if log_group is empty or boto3 is unavailable. The boto3 client is
+    created once per process and reused by later sessions.
     """
     global _client, _log_group, _log_stream
     if not log_group:
         return
     try:
-        import boto3
-        _client = boto3.client("logs")
+        if _client is None:
+            import boto3
+            _client = boto3.client("logs")
         _log_group = log_group
         _log_stream = log_stream
         _ensure()
@@ -53,21 +53,38 @@ def _should_ignore_in_diff(rel_path):
     return False
 
 
+def _diff_files(root):
+    """Relative paths of the files under root that belong in a diff.
+
+    Ignored directories are pruned before descending, so node_modules or a
+    venv is never listed, rather than walked and filtered file by file.
+    """
+    files = set()
+    stack = [(str(root), "")]
+    while stack:
+        path, prefix = stack.pop()
+        try:
+            it = os.scandir(path)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in DIFF_IGNORE and not name.endswith(_DIFF_IGNORE_SUFFIXES):
+                        stack.append((entry.path, prefix + name + "/"))
+                elif name not in DIFF_SKIP_FILES and entry.is_file():
+                    files.add(Path(prefix + name))
+    return files
+
+
 def compute_diff(snapshot_path, workspace_path):
     """Compare snapshot against workspace. Returns list of file diffs."""
     snapshot_path = Path(snapshot_path)
     workspace_path = Path(workspace_path)
 
-    snapshot_files = {
-        f.relative_to(snapshot_path)
-        for f in snapshot_path.rglob("*")
-        if f.is_file() and not _should_ignore_in_diff(f.relative_to(snapshot_path))
-    }
-    workspace_files = {
-        f.relative_to(workspace_path)
-        for f in workspace_path.rglob("*")
-        if f.is_file() and not _should_ignore_in_diff(f.relative_to(workspace_path))
-    }
+    snapshot_files = _diff_files(snapshot_path)
+    workspace_files = _diff_files(workspace_path)
 
     diffs = []
 
@@ -135,7 +152,8 @@ def compute_diff_from_overlay(overlay_changes, snapshot_path):
     """Compute structured diffs from the overlay upper layer.
 
     overlay_changes: list of dicts from sandbox.get_diff():
-        [{"path": str, "deleted": bool, "content_b64": str}]
+        [{"path": str, "deleted": bool, "exists_in_snapshot": bool, "content": bytes}]
+        (base64 text under "content_b64" is accepted in place of "content")
     snapshot_path: local path to the read-only snapshot dir.
 
     Returns the same format as compute_diff(), with an extra "_content_bytes" key
@@ -170,7 +188,9 @@ def compute_diff_from_overlay(overlay_changes, snapshot_path):
                 })
             continue
 
-        content_bytes = base64.b64decode(change["content_b64"])
+        content_bytes = change.get("content")
+        if content_bytes is None:
+            content_bytes = base64.b64decode(change["content_b64"])
         status = "modified" if change.get("exists_in_snapshot", True) else "created"
 
         # Binary detection: check extension or null bytes
@@ -448,6 +468,31 @@ Return valid JSON only. No markdown fences, no explanation outside the JSON.\
 """
 
 
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _load_json_object(text):
+    """Parse a JSON object, tolerating prose before or after it.
+
+    Tries strict json.loads first, then raw_decode from each "{" in turn, so a
+    model that wraps valid JSON in a sentence doesn't cost us the review.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        error = e
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj
+        except json.JSONDecodeError:
+            pass
+        start = text.find("{", start + 1)
+    raise error
+
+
 def review_changes(diffs, task, model):
     """Summarize changes, scan for security issues, and check prompt adherence.
 
@@ -472,7 +517,7 @@ def review_changes(diffs, task, model):
         m = _FENCE_RE.match(text)
         if m:
             text = m.group(1).strip()
-        return json.loads(text)
+        return _load_json_object(text)
     except json.JSONDecodeError as e:
         console.print(f"[yellow]Reviewer: bad JSON in response — {e}[/yellow]")
     except Exception as e:
@@ -33,9 +33,25 @@ def load_ftlignore(project_path):
     return patterns
 
 
+_ignore_cache = {}  # project path -> (.ftlignore mtime_ns or None, ignore set)
+
+
 def get_ignore_set(project_path):
-    """Get the full ignore set for a project."""
-    return ALWAYS_IGNORE | load_ftlignore(project_path)
+    """Get the full ignore set for a project.
+
+    Cached per project and re-read only when .ftlignore's mtime changes, so
+    repeated snapshots in one session skip the parse.
+    """
+    try:
+        mtime = (Path(project_path) / ".ftlignore").stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    cached = _ignore_cache.get(str(project_path))
+    if cached is None or cached[0] != mtime:
+        cached = _ignore_cache[str(project_path)] = (
+            mtime, frozenset(ALWAYS_IGNORE | load_ftlignore(project_path))
+        )
+    return cached[1]
 
 
 def should_ignore(path, ignore_set):
@@ -3,6 +3,10 @@ from pathlib import Path
 
 SUPPORTED_LANGUAGES = {"python", "typescript", "go", "java", "cpp"}
 
+# Client for the pre-forked pytest server a sandbox may keep warm. It falls
+# back to a cold `python -m pytest` on its own if the server isn't running.
+WARM_PYTEST_CLIENT = "/tmp/_ftl_pytest/client.py"
+
 
 def _validate_language(language):
     if language not in SUPPORTED_LANGUAGES:
@@ -186,7 +190,11 @@ def language_test_runtime(language, project_path=None):
     runtimes = {
         "python": {
             "path": "/workspace/_ftl_test.py",
-            "run": "cd /workspace && python -m pytest _ftl_test.py -v 2>&1",
+            "run": (
+                f"cd /workspace && if [ -f {WARM_PYTEST_CLIENT} ]; "
+                f"then python {WARM_PYTEST_CLIENT} _ftl_test.py -v; "
+                "else python -m pytest _ftl_test.py -v; fi 2>&1"
+            ),
             "cleanup": "rm -f /workspace/_ftl_test.py",
         },
         "typescript": {
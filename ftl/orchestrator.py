@@ -2,12 +2,15 @@ import os
 import platform
 import shutil
 import subprocess
+import sys
+import threading
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from rich.console import Console
+from rich.markup import escape
 
 from ftl import cloudwatch
 from ftl.config import load_config, find_config
@@ -26,21 +29,49 @@ from ftl.languages import resolve_language
 
 setup_langfuse()
 
+# Shared pool for short-lived work overlapped with sandbox/agent stages.
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ftl")
+
+
+def _submit_daemon(fn, *args):
+    """Run fn(*args) on a daemon thread and return a Future for its result.
+
+    For long calls a failed session may abandon: unlike _EXECUTOR work, a
+    still-running call doesn't hold up interpreter exit.
+    """
+    future = Future()
+
+    def _run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, daemon=True).start()
+    return future
+
+
+# One console per process — terminal capability probing happens once, not per session.
+_CONSOLE = Console()
+
 
 def _try_start_proxy(swap_table):
-    """Start the credential-swap proxy if cryptography is available and swap_table is non-empty.
+    """Start the credential-swap proxy if its dependencies are available and swap_table is non-empty.
 
-    Returns the proxy instance (started), or None if disabled/unavailable.
+    Returns (proxy, error): the started proxy or None, and why it couldn't
+    start (None if disabled or started).
     """
     if not swap_table:
-        return None
+        return None, None
     try:
         from ftl.proxy import CredentialSwapProxy
         proxy = CredentialSwapProxy(swap_table)
         proxy.start()
-        return proxy
-    except (ImportError, RuntimeError):
-        return None
+        return proxy, None
+    except (ImportError, RuntimeError) as e:
+        return None, str(e)
 
 
 # Agent auth env vars to forward from host into sandbox.
@@ -59,39 +90,159 @@ AGENT_REQUIRED_KEY = {
 
 def _collect_agent_env(agent_name, config):
     """Collect auth env vars for the agent from the host environment."""
-    env = {}
-    for key in AGENT_AUTH_VARS.get(agent_name, []):
-        if key in os.environ:
-            env[key] = os.environ[key]
-    for key in config.get("agent_env", []):
-        if key in os.environ:
-            env[key] = os.environ[key]
-    return env
+    host_env = dict(os.environ)
+    keys = AGENT_AUTH_VARS.get(agent_name, []) + list(config.get("agent_env", []))
+    return {key: host_env[key] for key in keys if key in host_env}
+
+
+_WRITE_CHUNK = 1 << 20
+
+
+def _write_bytes_efficient(path, data):
+    """Write data to path, in 1 MiB unbuffered chunks for large payloads.
+
+    Avoids handing the kernel one multi-megabyte write and keeps Python from
+    copying the buffer into its own file buffer first.
+    """
+    if len(data) < _WRITE_CHUNK:
+        with open(path, "wb") as f:
+            f.write(data)
+        return
+    with open(path, "wb", buffering=0) as f:
+        view = memoryview(data)
+        while view:
+            written = f.write(view[:_WRITE_CHUNK])
+            view = view[written:]
+
+
+_COPY_BUFSIZE = 4 << 20
+_COMPARE_BUFSIZE = 1 << 20
+
+# In-kernel copy primitives, best first: copy_file_range reflinks on btrfs/XFS.
+# sendfile only takes offset=None (use the file position) on Linux.
+_KERNEL_COPIES = [
+    f for f in (
+        getattr(os, "copy_file_range", None),
+        (lambda in_fd, out_fd, count: os.sendfile(out_fd, in_fd, None, count))
+        if sys.platform.startswith("linux") else None,
+    ) if f is not None
+]
+
+
+def _fast_copy(src, dst):
+    """Copy file contents src → dst without bouncing through userspace buffers.
+
+    Falls back to a 4 MiB userspace copy when neither kernel path is
+    supported. Only the permission bits are carried over — timestamps don't
+    matter for merged files.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        remaining = os.fstat(in_fd).st_size
+        for kernel_copy in _KERNEL_COPIES:
+            try:
+                while remaining > 0:
+                    n = kernel_copy(in_fd, out_fd, remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            except (OSError, TypeError, ValueError):
+                continue  # unsupported for this pair of files — try the next one
+            break
+        if remaining > 0:
+            shutil.copyfileobj(fsrc, fdst, _COPY_BUFSIZE)
+    shutil.copymode(src, dst)
+
+
+def _already_merged(dest, data=None, src=None):
+    """True if dest already holds the new content, so a "modified" write is a no-op.
+
+    Sizes are compared first; only same-size files are read. In-memory content
+    is compared directly. Workspace files matching size, mode and mtime are
+    taken as identical, as the diff script does against the snapshot manifest;
+    otherwise they're compared chunk by chunk, stopping at the first difference.
+    """
+    try:
+        dest_stat = os.stat(dest)
+        if data is not None:
+            if dest_stat.st_size != len(data):
+                return False
+            with open(dest, "rb") as f:
+                return f.read() == data
+        src_stat = os.stat(src)
+        if (src_stat.st_size, src_stat.st_mode) != (dest_stat.st_size, dest_stat.st_mode):
+            return False
+        if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+            return True  # rsync-style quick check: same size and mtime
+        # 1 MiB reads into reused buffers: few syscalls, no bytes per chunk.
+        size = min(src_stat.st_size, _COMPARE_BUFSIZE) or 1
+        buf_a, buf_b = memoryview(bytearray(size)), memoryview(bytearray(size))
+        with open(src, "rb") as a, open(dest, "rb") as b:
+            while True:
+                n = a.readinto(buf_a)
+                if n != b.readinto(buf_b) or buf_a[:n] != buf_b[:n]:
+                    return False
+                if not n:
+                    return True
+    except OSError:
+        return False
+
+
+_MERGE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
 
 
 def _merge_changes(diffs, workspace, project_path):
     """Apply only the actual changes back to the project (diff-driven merge).
 
     For diffs produced by get_diff(), content is in diff["_content_bytes"].
-    Falls back to shutil.copy2 from a local workspace path if not present.
+    Falls back to copying from a local workspace path if not present.
+    Directories are created up front; file writes then run on a thread pool
+    since they're dominated by syscall and disk latency. When a local workspace
+    shares a filesystem with the project, files are renamed into place instead
+    of copied — the workspace is discarded after merge anyway.
+
+    Returns the number of modified files skipped because the project already
+    had identical content.
     """
-    workspace = Path(workspace)
-    project = Path(project_path)
-
-    for diff in diffs:
-        rel = Path(diff["path"])
-        if diff["status"] in ("created", "modified"):
-            dest = project / rel
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            if "_content_bytes" in diff:
-                dest.write_bytes(diff["_content_bytes"])
-            else:
-                src = workspace / rel
-                shutil.copy2(src, dest)
-        elif diff["status"] == "deleted":
-            target = project / rel
-            if target.exists():
-                target.unlink()
+    workspace_str = str(workspace)
+    project_str = str(project_path)
+    try:
+        same_device = os.stat(workspace_str).st_dev == os.stat(project_str).st_dev
+    except OSError:
+        same_device = False
+    to_write = [d for d in diffs if d["status"] in ("created", "modified")]
+    to_delete = [d for d in diffs if d["status"] == "deleted"]
+
+    for parent in {os.path.dirname(os.path.join(project_str, d["path"])) for d in to_write}:
+        os.makedirs(parent, exist_ok=True)
+
+    def _write(diff):
+        dest = os.path.join(project_str, diff["path"])
+        data = diff.get("_content_bytes")
+        src = None if data is not None else os.path.join(workspace_str, diff["path"])
+        if diff["status"] == "modified" and _already_merged(dest, data, src):
+            return False
+        if data is not None:
+            _write_bytes_efficient(dest, data)
+        elif same_device:
+            os.replace(src, dest)
+        else:
+            _fast_copy(src, dest)
+        return True
+
+    if len(to_write) > 1:
+        with ThreadPoolExecutor(max_workers=min(_MERGE_WORKERS, len(to_write))) as pool:
+            written = list(pool.map(_write, to_write))
+    else:
+        written = [_write(diff) for diff in to_write]
+
+    for diff in to_delete:
+        try:
+            os.unlink(os.path.join(project_str, diff["path"]))
+        except FileNotFoundError:
+            pass
+
+    return written.count(False)
 
 
 class Session:
@@ -103,7 +254,7 @@ class Session:
     """
 
     def __init__(self):
-        self.console = Console()
+        self.console = _CONSOLE
         self.config = load_config()
         self.config_path = find_config()
         self.project_path = str(self.config_path.parent)
@@ -124,10 +275,13 @@ class Session:
         self.snapshot_path = None
         self.workspace = None
         self.diffs = None
+        self._diff_cache = {}  # workspace generation -> diffs
+        self._diff_fingerprint = None
         self.shadow_env = None
         self.task = None
         self.history = []
         self._proxy = None
+        self._proxy_error = None
         self._review = None
         self._test_exit_code = None
         self._test_output = None
@@ -195,15 +349,32 @@ class Session:
                 boot_notes.append(f"shadow {len(self.shadow_env)}")
 
         if self._proxy:
-            self._proxy.stop()
+            _EXECUTOR.submit(self._proxy.stop)  # new proxy gets a fresh port
             self._proxy = None
-        self._proxy = _try_start_proxy(swap_table)
+        self._proxy, self._proxy_error = _try_start_proxy(swap_table)
         if self._proxy:
             boot_notes.append(f"proxy :{self._proxy.port}")
         elif swap_table:
             boot_notes.append("proxy unavailable")
 
         agent_env = _collect_agent_env(self.agent_name, self.config)
+        self._check_agent_auth(agent_env)
+
+        if self._proxy:
+            agent_env.update(self._proxy.env_vars())
+        if agent_env:
+            boot_notes.append(f"auth {len(agent_env)}")
+        return boot_notes, swap_table, agent_env
+
+    def _warn_proxy_unavailable(self):
+        self.console.print(
+            f"[yellow]Warning: credential-swap proxy unavailable ({escape(str(self._proxy_error))}). "
+            "Install its dependencies (cryptography, urllib3): pip install -e '.\\[proxy]'. "
+            "Live API calls may fail.[/yellow]"
+        )
+
+    def _check_agent_auth(self, agent_env):
+        """Exit with a hint if agent_env lacks the key the agent needs."""
         required_key = AGENT_REQUIRED_KEY.get(self.agent_name)
         if required_key and required_key not in agent_env:
             self.console.print(
@@ -219,17 +390,13 @@ class Session:
                 )
                 raise SystemExit(1)
 
-        if self._proxy:
-            agent_env.update(self._proxy.env_vars())
-        if agent_env:
-            boot_notes.append(f"auth {len(agent_env)}")
-        return boot_notes, swap_table, agent_env
-
     def _activate_sandbox(self, snapshot_path, agent_env, boot_notes):
         """Boot or refresh the sandbox for a fresh snapshot."""
         boot_status = StatusPulse(self.console, "boot")
         boot_status.start()
 
+        self._diff_cache = {}
+        self._diff_fingerprint = None
         if self.sandbox is None:
             self.sandbox = create_sandbox(agent=self.agent_name)
             self.sandbox.boot(
@@ -273,43 +440,46 @@ class Session:
         boot_notes, swap_table, agent_env = self._build_runtime_env()
         self._activate_sandbox(self.snapshot_path, agent_env, boot_notes)
         if swap_table and not self._proxy:
-            self.console.print(
-                "[yellow]Warning: credential-swap proxy unavailable "
-                "(install cryptography: pip install -e '.[proxy]'). "
-                "Live API calls may fail.[/yellow]"
-            )
+            self._warn_proxy_unavailable()
 
     def start(self, task):
         """Start a new coding session: snapshot → sandbox → agent ∥ test-gen → run tests → diff."""
-        # Init CloudWatch tracing (no-op if not configured or boto3 absent)
-        log_group = self.config.get("cloudwatch_log_group", "")
-        log_stream = f"{datetime.now().strftime('%Y/%m/%d')}/{self.trace_id}"
-        cloudwatch.init(log_group, log_stream)
-        cloudwatch.emit(self.trace_id, "session", "start",
-                        task=task, project=self.project_path, agent=self.agent_name)
-
-        # 1. Snapshot
-        snapshot_status = StatusPulse(self.console, "snapshot")
-        snapshot_status.start()
-        snapshot_store = create_snapshot_store(self.config)
-        self.snapshot_id = snapshot_store.create(self.project_path)
-        self.snapshot_path = str(Path.home() / ".ftl" / "snapshots" / self.snapshot_id)
-        elapsed = snapshot_status.stop(detail=self.snapshot_id)
-        cloudwatch.emit(self.trace_id, "stage", "snapshot", elapsed_ms=elapsed * 1000)
-
-        # 2. Shadow credentials, proxy, auth, and sandbox
-        boot_notes, swap_table, agent_env = self._build_runtime_env()
-        self._activate_sandbox(self.snapshot_path, agent_env, boot_notes)
-        if swap_table and not self._proxy:
-            self.console.print(
-                "[yellow]Warning: credential-swap proxy unavailable "
-                "(install cryptography: pip install -e '.[proxy]'). "
-                "Live API calls may fail.[/yellow]"
-            )
-
-        # 5. Run agent + generate tests in parallel.
-        #    Tests generate while the agent codes; when the agent finishes the
-        #    diff is shown immediately and tests run in a background thread.
+        # Test generation only needs the task — start it before snapshot + boot
+        # so the tester call overlaps every stage up to the agent finishing,
+        # but only once auth is known good, so a session that can't run
+        # doesn't pay for it. It runs on a daemon thread: if snapshot or boot
+        # fails, the call is abandoned rather than keeping ftl from exiting.
+        self._check_agent_auth(_collect_agent_env(self.agent_name, self.config))
+        test_future = _submit_daemon(generate_tests_from_task, task, self.tester, self.language)
+        try:
+            # Init CloudWatch tracing (no-op if not configured or boto3 absent)
+            log_group = self.config.get("cloudwatch_log_group", "")
+            log_stream = f"{datetime.now().strftime('%Y/%m/%d')}/{self.trace_id}"
+            cloudwatch.init(log_group, log_stream)
+            cloudwatch.emit(self.trace_id, "session", "start",
+                            task=task, project=self.project_path, agent=self.agent_name)
+
+            # 1. Snapshot
+            snapshot_status = StatusPulse(self.console, "snapshot")
+            snapshot_status.start()
+            snapshot_store = create_snapshot_store(self.config)
+            self.snapshot_id = snapshot_store.create(self.project_path)
+            self.snapshot_path = str(Path.home() / ".ftl" / "snapshots" / self.snapshot_id)
+            elapsed = snapshot_status.stop(detail=self.snapshot_id)
+            cloudwatch.emit(self.trace_id, "stage", "snapshot", elapsed_ms=elapsed * 1000)
+
+            # 2. Shadow credentials, proxy, auth, and sandbox
+            boot_notes, swap_table, agent_env = self._build_runtime_env()
+            self._activate_sandbox(self.snapshot_path, agent_env, boot_notes)
+            if swap_table and not self._proxy:
+                self._warn_proxy_unavailable()
+        except BaseException:
+            test_future.cancel()
+            raise
+
+        # 5. Run agent while tests keep generating in the background.
+        #    When the agent finishes the diff is computed immediately and the
+        #    tests run as soon as generation is done.
         heartbeat = AgentHeartbeat(self.console)
         renderer = AgentRenderer(self.console, trace_id=self.trace_id)
         agent_t0 = time.time()
@@ -324,9 +494,8 @@ class Session:
             renderer.finish()
             return result
 
-        with ThreadPoolExecutor(max_workers=2) as executor:
+        with ThreadPoolExecutor(max_workers=1) as executor:
             agent_future = executor.submit(_run_agent)
-            test_future = executor.submit(generate_tests_from_task, task, self.tester, self.language)
 
         try:
             agent_future.result()
@@ -339,45 +508,49 @@ class Session:
         self.console.print(f"  [dim]agent  {elapsed:.1f}s[/dim]")
         cloudwatch.emit(self.trace_id, "stage", "agent", elapsed_ms=elapsed * 1000)
 
-        # 6. Run tests — generation was parallel so test_future is usually
-        #    already done by the time the agent finishes.
-        # Compute diff now — agent is done, sandbox state is final. Storing eagerly
-        # so the reviewer and test runner can both start immediately.
-        self.diffs = self.sandbox.get_diff(self.snapshot_path)
-        active_language = resolve_language(
-            self.project_path,
-            self.config.get("language"),
-            self.config.get("language_overrides"),
-            [diff["path"] for diff in self.diffs],
-        ) or self.language
-        test_code = test_future.result()
-        if active_language != self.language:
-            self.language = active_language
-            test_code = generate_tests_from_task(task, self.tester, self.language)
+        # 6. Diff, then tests and review. Test generation ran in parallel with
+        #    the agent, so test_future is usually done already. The diff is
+        #    taken first, while /workspace is final: the tests write caches and
+        #    output files there that must not end up in the reviewed diff.
+        diff_bound = bool(self.config.get("language_overrides")) and not self.config.get("language")
+
+        def _run_tests(code):
+            if not code:
+                return None, None
+            self.console.print("[bold]Running tests...[/bold]")
+            return run_test_code(code, self.sandbox, self.console, self.language, self.project_path)
 
-        # Run tests + reviewer in parallel. Both run while the user waits;
-        # reviewer output is shown before the raw diff at merge time.
         self._review = None
         reviewer_model = self.config.get("reviewer", self.tester)
         checking_status = StatusPulse(self.console, "checking")
         checking_status.start()
         checking_t0 = time.time()
         with ThreadPoolExecutor(max_workers=2) as review_exec:
+            self._get_diffs(after_write=True)
             review_future = (
                 review_exec.submit(review_changes, self.diffs, task, reviewer_model)
                 if reviewer_model and self.diffs else None
             )
-            if test_code:
-                self.console.print("[bold]Running tests...[/bold]")
+            active_language = self.language
+            if diff_bound:
+                active_language = resolve_language(
+                    self.project_path,
+                    self.config.get("language"),
+                    self.config.get("language_overrides"),
+                    [diff["path"] for diff in self.diffs],
+                ) or self.language
+            if active_language == self.language:
+                test_run_future = review_exec.submit(lambda: _run_tests(test_future.result()))
+            else:
+                # Regenerate on the pool so the reviewer call overlaps it.
+                self.language = active_language
                 test_run_future = review_exec.submit(
-                    run_test_code, test_code, self.sandbox, self.console, self.language, self.project_path
+                    lambda: _run_tests(generate_tests_from_task(task, self.tester, active_language))
                 )
-                self._test_exit_code, self._test_output = test_run_future.result()
-            else:
-                self._test_exit_code = None
-                self._test_output = None
+            self._test_exit_code, self._test_output = test_run_future.result()
         elapsed = time.time() - checking_t0
-        checking_status.stop(detail="tests + review" if review_future is not None and test_code else "review" if review_future is not None else "tests" if test_code else "quick")
+        ran_tests = self._test_exit_code is not None
+        checking_status.stop(detail="tests + review" if review_future is not None and ran_tests else "review" if review_future is not None else "tests" if ran_tests else "quick")
         cloudwatch.emit(self.trace_id, "stage", "tests", elapsed_ms=elapsed * 1000)
         # Both futures are complete when the with block exits (shutdown waits)
         if review_future is not None:
@@ -394,10 +567,32 @@ class Session:
             "agent": self.agent_name,
         }, trace_id=self.trace_id)
 
-    def _get_diffs(self):
-        """Return diffs, computing lazily on first call."""
-        if self.diffs is None and self.sandbox:
-            self.diffs = self.sandbox.get_diff(self.snapshot_path)
+    def _get_diffs(self, after_write=False):
+        """Return diffs, recomputing only when the sandbox workspace has changed.
+
+        Cached per workspace generation, so a follow-up that wrote nothing
+        reuses the previous diff instead of re-scanning the workspace. When the
+        generation moved (e.g. a test run), the sandbox's fingerprint, when it
+        offers one, decides whether any file actually changed before re-diffing;
+        without one the workspace is always re-diffed. Backends without
+        generation tracking compute lazily and re-diff when the caller passes
+        after_write=True.
+        """
+        if not self.sandbox:
+            return self.diffs or []
+        generation = self.sandbox.workspace_generation()
+        if generation is None:
+            if after_write or self.diffs is None:
+                self.diffs = self.sandbox.get_diff(self.snapshot_path)
+        elif generation in self._diff_cache:
+            self.diffs = self._diff_cache[generation]
+        else:
+            fingerprint = self.sandbox.workspace_fingerprint()
+            if (fingerprint is None or fingerprint != self._diff_fingerprint
+                    or self.diffs is None):
+                self.diffs = self.sandbox.get_diff(self.snapshot_path)
+            self._diff_cache = {generation: self.diffs}
+            self._diff_fingerprint = fingerprint
         return self.diffs or []
 
     def follow_up(self, message):
@@ -420,7 +615,7 @@ class Session:
         renderer.finish()
         self.agent_calls += 1
         self.history.append(message)
-        self.diffs = self.sandbox.get_diff(self.snapshot_path)
+        self._get_diffs(after_write=True)
         self._describe_follow_up(self._changed_paths_since(before, self.diffs), self.diffs)
         self._review = None
         self._test_exit_code = None
@@ -521,14 +716,16 @@ class Session:
         decision = review_diff(
             diffs, self.sandbox, self.workspace, self.agent,
             question_context=self._agent_context(),
-            get_diffs=lambda: self.sandbox.get_diff(self.snapshot_path),
+            get_diffs=lambda: self._get_diffs(after_write=True),
             allow_continue=allow_continue,
         )
 
         if decision == "approve":
             self.console.print("[bold green]Approved. Merging changes...[/bold green]")
-            _merge_changes(diffs, self.workspace, self.project_path)
+            unchanged = _merge_changes(diffs, self.workspace, self.project_path)
             self.console.print("  Changes merged to project.")
+            if unchanged:
+                self.console.print(f"  [dim]{unchanged} file(s) already up to date.[/dim]")
             write_log({
                 "event": "merge",
                 "task": self.task or "",
@@ -540,7 +737,7 @@ class Session:
             }, trace_id=self.trace_id)
             self._cleanup()
         elif decision == "continue":
-            self.diffs = self.sandbox.get_diff(self.snapshot_path)
+            self._get_diffs(after_write=True)
             self.console.print("[bold cyan]Back to sandbox. Keep iterating, then merge again when ready.[/bold cyan]")
             write_log({
                 "event": "review",
@@ -578,13 +775,17 @@ class Session:
             self.sandbox.standby()
             self.console.print(f"[dim]Snapshot {self.snapshot_id} available for rollback.[/dim]")
         if self._proxy:
-            self._proxy.stop()
+            # shutdown() waits out serve_forever's poll interval; don't hold the
+            # prompt for it. Executor threads are joined at interpreter exit.
+            _EXECUTOR.submit(self._proxy.stop)
             self._proxy = None
         self.sandbox = None
         self.agent = None
         self.agent_calls = 0
         self.workspace = None
         self.diffs = None
+        self._diff_cache = {}
+        self._diff_fingerprint = None
         self._review = None
         self.shadow_env = None
         self.history = []
@@ -597,16 +798,38 @@ class Session:
         return self.sandbox is not None
 
 
+# Fire-and-forget: nothing waits on the notifier and its output is unused.
+_DETACHED = {
+    "stdout": subprocess.DEVNULL,
+    "stderr": subprocess.DEVNULL,
+    "start_new_session": True,
+    "close_fds": True,
+}
+
+
+def _esc(text):
+    """Escape a value for use inside an AppleScript string literal."""
+    return str(text).replace("\\", "\\\\").replace('"', '\\"')
+
+
 def _notify(title, message):
     """Send a system notification. Best-effort — never raises."""
     try:
         if platform.system() == "Darwin":
-            subprocess.run(
-                ["osascript", "-e", f'display notification "{message}" with title "{title}"'],
-                capture_output=True,
+            # Script goes over stdin, escaped — task text can't break out of the
+            # string literal. A minimal env keeps the notifier's execve cheap.
+            script = f'display notification "{_esc(message)}" with title "{_esc(title)}"'
+            proc = subprocess.Popen(
+                ["osascript"],
+                stdin=subprocess.PIPE,
+                env={"PATH": "/usr/bin"},
+                **_DETACHED,
             )
+            # Script is far smaller than the pipe buffer, so this never blocks.
+            proc.stdin.write(script.encode())
+            proc.stdin.close()
         elif platform.system() == "Linux":
-            subprocess.run(["notify-send", title, message], capture_output=True)
+            subprocess.Popen(["notify-send", title, message], **_DETACHED)
     except Exception:
         pass
 
@@ -7,14 +7,22 @@ from rich.console import Console
 from ftl.agents import get_agent, AGENTS
 from ftl.languages import language_test_instructions, language_test_runtime
 
+_CONSOLE = Console()
+
+
+_MISSING_MOD_RE = re.compile(r"ModuleNotFoundError: No module named '([^']+)'")
+
 
 def _extract_missing_modules(output):
     """Return top-level package names from ModuleNotFoundError lines."""
-    pattern = re.compile(r"ModuleNotFoundError: No module named '([^']+)'")
-    return {m.split(".")[0] for m in pattern.findall(output)}
+    return {m.split(".")[0] for m in _MISSING_MOD_RE.findall(output)}
 
 
-_FENCE_RE = re.compile(r"^```\w*\n(.*?)```$", re.DOTALL)
+# Whole-reply fence; tolerates surrounding whitespace and info strings like "c++".
+_FENCE_RE = re.compile(r"\s*```[^\n`]*\n(.*?)```\s*", re.DOTALL)
+# Closing fence: a line of just ``` ending in a newline or the end of the
+# reply. Indented or info-string fences (a docstring example) don't count.
+_CLOSE_FENCE_RE = re.compile(r"^```[ \t]*(\n|\Z)", re.MULTILINE)
 
 _TASK_TESTER_SYSTEM = (
     "You are an adversarial test engineer. Given a coding task description, "
@@ -49,10 +57,62 @@ _DIFF_TESTER_SYSTEM = (
 
 def _strip_fence(code):
     """Strip markdown code fences if present."""
-    match = _FENCE_RE.search(code.strip())
+    match = _FENCE_RE.fullmatch(code)
     return match.group(1) if match else code
 
 
+def _close_stream(response):
+    """Close a litellm stream, so an abandoned reply stops generating and its
+    connection goes back to the pool."""
+    # CustomStreamWrapper has no close() of its own; the provider stream it
+    # wraps (an SDK stream or a generator) does.
+    stream = getattr(response, "completion_stream", response)
+    close = getattr(stream, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+def _complete_code(model, messages):
+    """Stream a tester completion and return its code.
+
+    Models often follow the code block with an explanation we never use, so
+    reading stops as soon as the first fenced block closes. Unfenced replies
+    are read to the end.
+    """
+    text = ""
+    body_start = -1
+    response = litellm.completion(model=model, messages=messages, stream=True)
+    try:
+        for chunk in response:
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            searched = len(text)
+            text += delta
+            if body_start < 0:
+                fence = text.find("```")
+                if fence < 0 or text.find("\n", fence) < 0:
+                    continue
+                body_start = searched = text.index("\n", fence) + 1
+            # Rescan from the start of the line the new text extends, so a
+            # closing fence split across chunks is found. Mid-stream it only
+            # counts once its line has ended: "```" could still become "```py".
+            line_start = max(body_start, text.rfind("\n", 0, searched) + 1)
+            close = _CLOSE_FENCE_RE.search(text, line_start)
+            if close and close.group(1):
+                return text[body_start:close.start()]
+    finally:
+        _close_stream(response)
+    if body_start >= 0:
+        close = _CLOSE_FENCE_RE.search(text, body_start)
+        if close:
+            return text[body_start:close.start()]
+    return _strip_fence(text)
+
+
 def _task_tester_system(language):
     return f"{_TASK_TESTER_SYSTEM}\n\n{language_test_instructions(language)}"
 
@@ -68,9 +128,9 @@ def generate_tests_from_task(task, model, language="python"):
     the implementation, just the task. Returns test code string, or None on failure.
     """
     try:
-        response = litellm.completion(
-            model=model,
-            messages=[
+        return _complete_code(
+            model,
+            [
                 {
                     "role": "system",
                     "content": _task_tester_system(language),
@@ -81,7 +141,6 @@ def generate_tests_from_task(task, model, language="python"):
                 },
             ],
         )
-        return _strip_fence(response.choices[0].message.content)
     except Exception:
         return None
 
@@ -94,17 +153,26 @@ def run_test_code(test_code, sandbox, console, language="python", project_path=N
     run_cmd = runtime["run"]
     cleanup_cmd = runtime["cleanup"]
 
-    sandbox.exec(f"mkdir -p $(dirname {test_file}) && cat > {test_file} << 'FTLEOF'\n{test_code}\nFTLEOF")
-
-    exit_code, stdout, stderr = sandbox.exec(run_cmd)
+    sandbox.write_file(test_file, test_code.encode())
 
-    # If tests failed due to missing modules, install them and retry once.
-    missing = _extract_missing_modules(stdout + stderr)
-    if missing and exit_code != 0 and language == "python":
-        sandbox.exec(f"pip install {' '.join(missing)} -q")
-        exit_code, stdout, stderr = sandbox.exec(run_cmd)
-
-    sandbox.exec(cleanup_cmd)
+    # Cleanup rides along with the run in one exec. Python keeps the file
+    # after a failure, since a missing-module retry needs to run it again.
+    run_and_cleanup = f"{run_cmd}; ec=$?; {cleanup_cmd}; exit $ec"
+    if language == "python":
+        first_cmd = f"{run_cmd}; ec=$?; [ $ec -ne 0 ] || {cleanup_cmd}; exit $ec"
+    else:
+        first_cmd = run_and_cleanup
+    exit_code, stdout, stderr = sandbox.exec(first_cmd)
+
+    if exit_code != 0 and language == "python":
+        # If tests failed due to missing modules, install them and retry once.
+        missing = _extract_missing_modules(stdout + stderr)
+        if missing:
+            exit_code, stdout, stderr = sandbox.exec(
+                f"pip install {' '.join(missing)} -q >/dev/null 2>&1; {run_and_cleanup}"
+            )
+        else:
+            sandbox.exec(cleanup_cmd)
 
     if exit_code == 0:
         console.print("[green]  Tests passed.[/green]")
@@ -119,7 +187,7 @@ def run_verification(diffs, tester, sandbox, language="python", project_path=Non
     """Manual test trigger: generate tests from diff and run them."""
     from ftl.diff import diff_to_text
 
-    console = Console()
+    console = _CONSOLE
     console.print(f"[bold]Running verification ({tester})...[/bold]")
 
     if tester in AGENTS:
@@ -136,9 +204,9 @@ def run_verification(diffs, tester, sandbox, language="python", project_path=Non
     else:
         diff_text = diff_to_text(diffs)
         try:
-            response = litellm.completion(
-                model=tester,
-                messages=[
+            test_code = _complete_code(
+                tester,
+                [
                     {
                         "role": "system",
                         "content": _diff_tester_system(language),
@@ -153,7 +221,6 @@ def run_verification(diffs, tester, sandbox, language="python", project_path=Non
             console.print(f"[red]  Tester API error: {e}[/red]")
             return 1, "", str(e)
 
-        test_code = response.choices[0].message.content
         exit_code, output = run_test_code(test_code, sandbox, console, language=language, project_path=project_path)
         stdout, stderr = output, ""
 
@@ -18,22 +18,35 @@ Usage:
     # ... agent runs, makes API calls through proxy ...
     proxy.stop()
 
-Requires: cryptography  (pip install -e ".[proxy]")
+Requires: cryptography, urllib3  (pip install -e ".[proxy]")
 """
 
 import os
-import select
+import re
+import selectors
+import shutil
 import socket
 import ssl
 import tempfile
 import threading
-import urllib.error
-import urllib.request
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import urllib3
 
 _CONNECT_TIMEOUT = 30
 _RELAY_TIMEOUT = 120
+_MAX_CONNECTIONS = 64
+_SLOT_POLL = 0.5  # seconds between shutdown checks while all slots are taken
+_SSL_CTX_CACHE_SIZE = 256
+
+# Proxies in one process share their CA and leaf key, so a warm container
+# that already trusts the CA skips update-ca-certificates on the next task.
+# Certs are valid for a day; regenerate well before that.
+_KEY_REUSE = timedelta(hours=12)
+_keys_lock = threading.Lock()
+_keys = None  # (created, ca_key_pem, ca_cert_pem, leaf_key_pem)
 
 
 def _find_free_port():
@@ -82,11 +95,27 @@ def _generate_ca():
     return key_pem, cert_pem
 
 
-def _generate_leaf_cert(hostname, ca_key_pem, ca_cert_pem):
-    """Generate a per-hostname leaf cert signed by the CA. Returns (key_pem, cert_pem)."""
+def _generate_leaf_key():
+    """Generate the RSA key shared by every leaf cert. Returns key_pem.
+
+    Keygen dominates leaf-cert cost; only the cert differs per host, so one
+    key per proxy leaves signing as the sole per-host work.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    )
+
+
+def _generate_leaf_cert(hostname, ca_key_pem, ca_cert_pem, leaf_key_pem):
+    """Generate a per-hostname leaf cert for leaf_key_pem signed by the CA. Returns cert_pem."""
     from cryptography import x509
     from cryptography.hazmat.primitives import hashes, serialization
-    from cryptography.hazmat.primitives.asymmetric import rsa
     from cryptography.hazmat.primitives.serialization import load_pem_private_key
     from cryptography.x509 import load_pem_x509_certificate
     from cryptography.x509.oid import NameOID
@@ -94,7 +123,7 @@ def _generate_leaf_cert(hostname, ca_key_pem, ca_cert_pem):
     ca_key = load_pem_private_key(ca_key_pem, password=None)
     ca_cert = load_pem_x509_certificate(ca_cert_pem)
 
-    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key = load_pem_private_key(leaf_key_pem, password=None)
     name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
     now = datetime.now(timezone.utc)
 
@@ -116,14 +145,22 @@ def _generate_leaf_cert(hostname, ca_key_pem, ca_cert_pem):
         pass
 
     cert = builder.sign(ca_key, hashes.SHA256())
+    return cert.public_bytes(serialization.Encoding.PEM)
 
-    key_pem = key.private_bytes(
-        serialization.Encoding.PEM,
-        serialization.PrivateFormat.TraditionalOpenSSL,
-        serialization.NoEncryption(),
-    )
-    cert_pem = cert.public_bytes(serialization.Encoding.PEM)
-    return key_pem, cert_pem
+
+def _replacer(table):
+    """Return a re.sub replacement callable that maps each match through table."""
+    return lambda m: table[m.group()]
+
+
+def _proxy_keys():
+    """Return (ca_key_pem, ca_cert_pem, leaf_key_pem), reused across proxies in this process."""
+    global _keys
+    with _keys_lock:
+        now = datetime.now(timezone.utc)
+        if _keys is None or now - _keys[0] > _KEY_REUSE:
+            _keys = (now, *_generate_ca(), _generate_leaf_key())
+        return _keys[1:]
 
 
 class _ProxyHandler(BaseHTTPRequestHandler):
@@ -133,17 +170,20 @@ class _ProxyHandler(BaseHTTPRequestHandler):
         pass  # suppress default stdout access log
 
     def _swap(self, data: bytes) -> bytes:
-        """Replace shadow credential bytes with real credential bytes."""
-        for shadow, real in self.server.swap_table.items():
-            if shadow.encode() in data:
-                data = data.replace(shadow.encode(), real.encode())
-        return data
+        """Replace shadow credential bytes with real credential bytes in one pass."""
+        swap_re = self.server.swap_re
+        # Most relayed chunks hold no credential at all; a memmem scan for the
+        # prefix every shadow shares rules them out far faster than the regex.
+        if swap_re is None or self.server.swap_prefix not in data:
+            return data
+        return swap_re.sub(self.server.swap_bytes_repl, data)
 
     def _swap_str(self, s: str) -> str:
-        for shadow, real in self.server.swap_table.items():
-            if shadow in s:
-                s = s.replace(shadow, real)
-        return s
+        """Replace shadow credentials with real ones in a header value in one pass."""
+        swap_str_re = self.server.swap_str_re
+        if swap_str_re is None:
+            return s
+        return swap_str_re.sub(self.server.swap_str_repl, s)
 
     # ------------------------------------------------------------------
     # HTTPS (CONNECT)
@@ -170,8 +210,10 @@ class _ProxyHandler(BaseHTTPRequestHandler):
         # Connect to the real upstream server
         try:
             upstream_sock = socket.create_connection((host, port), timeout=_CONNECT_TIMEOUT)
-            upstream_ssl = ssl.create_default_context().wrap_socket(
-                upstream_sock, server_hostname=host
+            upstream_ssl = self.server.upstream_ctx.wrap_socket(
+                upstream_sock,
+                server_hostname=host,
+                session=self.server.upstream_sessions.get(host),
             )
         except (socket.error, ssl.SSLError):
             client_ssl.close()
@@ -180,61 +222,91 @@ class _ProxyHandler(BaseHTTPRequestHandler):
         self._relay(client_ssl, upstream_ssl)
 
     def _get_ssl_context(self, hostname):
+        cache = self.server.ssl_ctx_cache
         with self.server.ssl_ctx_lock:
-            if hostname in self.server.ssl_ctx_cache:
-                return self.server.ssl_ctx_cache[hostname]
+            if hostname in cache:
+                cache.move_to_end(hostname)
+                return cache[hostname]
 
-        key_pem, cert_pem = _generate_leaf_cert(
+        cert_pem = _generate_leaf_cert(
             hostname,
             self.server.ca_key_pem,
             self.server.ca_cert_pem,
+            self.server.leaf_key_pem,
         )
 
         ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
 
-        # Write combined PEM to a temp file, load it, then delete
+        # The stdlib only loads certs from a path: write this host's cert
+        # once next to the shared key file and leave it for server_close.
         with tempfile.NamedTemporaryFile(
-            mode="wb", suffix=".pem", delete=False
+            mode="wb", suffix=".crt", dir=self.server.cert_dir, delete=False
         ) as tf:
-            tf.write(key_pem + cert_pem)
-            tmp_path = tf.name
-        try:
-            ctx.load_cert_chain(tmp_path)
-        finally:
-            os.unlink(tmp_path)
+            tf.write(cert_pem)
+        ctx.load_cert_chain(tf.name, self.server.leaf_key_path)
 
         with self.server.ssl_ctx_lock:
-            self.server.ssl_ctx_cache[hostname] = ctx
+            cache[hostname] = ctx
+            # LRU bound so many-domain sessions don't grow the cache forever.
+            if len(cache) > _SSL_CTX_CACHE_SIZE:
+                cache.popitem(last=False)
         return ctx
 
     def _relay(self, client, upstream):
         """Relay bytes between client and upstream with credential swapping on client→upstream."""
+        sel = selectors.DefaultSelector()
+        sel.register(client, selectors.EVENT_READ, upstream)
+        sel.register(upstream, selectors.EVENT_READ, client)
+        # upstream→client is pure passthrough: read it into one reused buffer
+        # instead of allocating a bytes object per chunk.
+        buf = memoryview(bytearray(65536))
         try:
             while True:
-                r, _, _ = select.select([client, upstream], [], [], _RELAY_TIMEOUT)
-                if not r:
+                events = sel.select(timeout=_RELAY_TIMEOUT)
+                if not events:
                     break
-                for sock in r:
-                    try:
-                        data = sock.recv(65536)
-                    except (ssl.SSLError, OSError):
-                        return
-                    if not data:
-                        return
-                    if sock is client:
-                        data = self._swap(data)
+                for key, _ in events:
+                    sock, peer = key.fileobj, key.data
+                    # Readable can mean a TLS record with no application data
+                    # (e.g. a TLS 1.3 session ticket); read without blocking so
+                    # that never stalls the other direction of the tunnel.
+                    sock.settimeout(0)
+                    peer.settimeout(_RELAY_TIMEOUT)
+                    # Records already decrypted into the SSL buffer never show
+                    # up as readable on the socket, so drain them before
+                    # waiting again.
+                    while True:
                         try:
-                            upstream.sendall(data)
-                        except OSError:
+                            if sock is client:
+                                data = sock.recv(65536)
+                            else:
+                                data = buf[:sock.recv_into(buf)]
+                        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+                            break
+                        except (ssl.SSLError, OSError):
+                            return
+                        if not data:
                             return
-                    else:
+                        if sock is client:
+                            data = self._swap(data)
                         try:
-                            client.sendall(data)
+                            peer.sendall(data)
                         except OSError:
                             return
+                        if not sock.pending():
+                            break
         except Exception:
             pass
         finally:
+            sel.close()
+            # Keep the upstream session (TLS 1.3 tickets arrive after the
+            # handshake) so the next tunnel to this host can resume it.
+            try:
+                session = upstream.session
+            except (AttributeError, ValueError):
+                session = None
+            if session is not None and upstream.server_hostname:
+                self.server.upstream_sessions[upstream.server_hostname] = session
             for s in (client, upstream):
                 try:
                     s.close()
@@ -269,29 +341,39 @@ class _ProxyHandler(BaseHTTPRequestHandler):
         if body:
             headers["Content-Length"] = str(len(body))
 
-        req = urllib.request.Request(
-            path,
-            data=body or None,
-            headers=headers,
-            method=self.command,
-        )
         try:
-            with urllib.request.urlopen(req, timeout=_CONNECT_TIMEOUT) as resp:
-                self.send_response(resp.status)
-                for k, v in resp.headers.items():
-                    if k.lower() not in ("transfer-encoding",):
-                        self.send_header(k, v)
-                self.end_headers()
-                self.wfile.write(resp.read())
-        except urllib.error.HTTPError as e:
-            self.send_response(e.code)
-            self.end_headers()
-            try:
-                self.wfile.write(e.read())
-            except Exception:
-                pass
+            resp = self.server.http_pool.urlopen(
+                self.command,
+                path,
+                body=body or None,
+                headers=headers,
+                redirect=False,
+                preload_content=False,
+                decode_content=False,
+                timeout=_CONNECT_TIMEOUT,
+            )
         except Exception as e:
             self.send_error(502, str(e))
+            return
+        try:
+            self.send_response(resp.status)
+            for k, v in resp.headers.items():
+                if k.lower() not in ("transfer-encoding",):
+                    self.send_header(k, v)
+            self.end_headers()
+            # Relay as it arrives: no buffering of the whole body, and
+            # streamed (SSE) responses reach the client incrementally.
+            # Without an upstream Content-Length the body is delimited by
+            # connection close, since the handler speaks HTTP/1.0.
+            while chunk := resp.read1(65536):
+                self.wfile.write(chunk)
+        except Exception:
+            # Client gone or upstream reset mid-body: unread bytes are left on
+            # the connection, so close it instead of pooling it for the next
+            # request (the pool reopens a closed connection on reuse).
+            resp.close()
+        finally:
+            resp.release_conn()
 
     do_GET = _forward
     do_POST = _forward
@@ -302,14 +384,76 @@ class _ProxyHandler(BaseHTTPRequestHandler):
     do_OPTIONS = _forward
 
 
-class _ProxyServer(HTTPServer):
-    def __init__(self, *args, swap_table, ca_key_pem, ca_cert_pem, **kwargs):
+class _ProxyServer(ThreadingHTTPServer):
+    # One thread per connection so a long-lived CONNECT tunnel never blocks
+    # other requests. Daemon threads don't hold up shutdown or exit.
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, *args, swap_table, ca_key_pem, ca_cert_pem, leaf_key_pem, **kwargs):
         super().__init__(*args, **kwargs)
         self.swap_table = swap_table
+        # One alternation over every shadow value (longest first, so a shadow
+        # that prefixes another never wins) replaces N scans per chunk.
+        self.swap_bytes = {s.encode(): r.encode() for s, r in swap_table.items()}
+        self.swap_re = re.compile(
+            b"|".join(re.escape(s) for s in sorted(self.swap_bytes, key=len, reverse=True))
+        ) if self.swap_bytes else None
+        # Shadows all start with SHADOW_PREFIX; derive the prefix from the
+        # table so hand-built tables still work (b"" disables the fast path).
+        self.swap_prefix = os.path.commonprefix(list(self.swap_bytes))
+        self.swap_str_re = re.compile(
+            "|".join(re.escape(s) for s in sorted(swap_table, key=len, reverse=True))
+        ) if swap_table else None
+        # Replacement callables are built once too, not per chunk or header.
+        self.swap_bytes_repl = _replacer(self.swap_bytes)
+        self.swap_str_repl = _replacer(swap_table)
         self.ca_key_pem = ca_key_pem
         self.ca_cert_pem = ca_cert_pem
-        self.ssl_ctx_cache = {}
+        self.leaf_key_pem = leaf_key_pem
+        self.cert_dir = tempfile.mkdtemp(prefix="ftl-proxy-")
+        self.leaf_key_path = os.path.join(self.cert_dir, "leaf.key")
+        with open(self.leaf_key_path, "wb") as f:
+            f.write(leaf_key_pem)
+        self.ssl_ctx_cache = OrderedDict()
         self.ssl_ctx_lock = threading.Lock()
+        # One upstream context: the CA bundle is parsed once, and its
+        # sessions can be resumed on later CONNECTs to the same host.
+        self.upstream_ctx = ssl.create_default_context()
+        self.upstream_sessions = {}
+        # Keep-alive connections per upstream host, so bursts of plain HTTP
+        # calls to one API skip the TCP handshake after the first request.
+        self.http_pool = urllib3.PoolManager(num_pools=32, maxsize=16, retries=False)
+        self.connection_slots = threading.BoundedSemaphore(_MAX_CONNECTIONS)
+        self.closing = False
+
+    def process_request(self, request, client_address):
+        # Bound concurrency: the accept loop waits for a free slot, waking up
+        # now and then so shutdown() isn't stuck behind long-lived tunnels.
+        while not self.connection_slots.acquire(timeout=_SLOT_POLL):
+            if self.closing:
+                self.shutdown_request(request)
+                return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.connection_slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+
+    def shutdown(self):
+        self.closing = True
+        super().shutdown()
+
+    def server_close(self):
+        super().server_close()
+        self.http_pool.clear()
+        shutil.rmtree(self.cert_dir, ignore_errors=True)
 
     def handle_error(self, request, client_address):
         pass  # swallow connection errors silently
@@ -330,7 +474,7 @@ class CredentialSwapProxy:
         """
         self.swap_table = swap_table
         self.port = _find_free_port()
-        self.ca_key_pem, self.ca_cert_pem = _generate_ca()
+        self.ca_key_pem, self.ca_cert_pem, self.leaf_key_pem = _proxy_keys()
         self._server = None
         self._thread = None
 
@@ -347,6 +491,7 @@ class CredentialSwapProxy:
             swap_table=self.swap_table,
             ca_key_pem=self.ca_key_pem,
             ca_cert_pem=self.ca_cert_pem,
+            leaf_key_pem=self.leaf_key_pem,
         )
         self._thread = threading.Thread(
             target=self._server.serve_forever,
@@ -356,9 +501,10 @@ class CredentialSwapProxy:
         self._thread.start()
 
     def stop(self):
-        """Shut down the proxy server."""
+        """Shut down the proxy server and release its port."""
         if self._server:
             self._server.shutdown()
+            self._server.server_close()
             self._server = None
 
     # Domains the agent uses for its own API calls — nothing to swap here,
@@ -380,17 +526,21 @@ class CredentialSwapProxy:
         - System store (Python, curl): /usr/local/share/ca-certificates/ + update-ca-certificates
         - Node.js store: /tmp/ftl-proxy-ca.crt, referenced via NODE_EXTRA_CA_CERTS
 
-        Must be called after sandbox.boot() and before the agent runs.
+        The trust store rebuild is skipped when the container already has
+        this exact CA installed (a warm container from an earlier task).
+
+        Must be called after sandbox.boot() and before the agent runs. PEM is
+        plain ASCII with no FTLEOF line, so it goes into the heredoc as-is.
         """
-        import base64
-        cert_b64 = base64.b64encode(self.ca_cert_pem).decode()
+        pem = self.ca_cert_pem.decode()
+        system_crt = "/usr/local/share/ca-certificates/ftl-proxy.crt"
         cmds = (
-            # System CA store (curl, Python requests, etc.)
-            f"echo '{cert_b64}' | base64 -d"
-            f" > /usr/local/share/ca-certificates/ftl-proxy.crt"
-            f" && update-ca-certificates -q"
             # Node.js CA file (Claude Code, any other Node apps)
-            f" && echo '{cert_b64}' | base64 -d > /tmp/ftl-proxy-ca.crt"
+            f"cat > /tmp/ftl-proxy-ca.crt << 'FTLEOF'"
+            # System CA store (curl, Python requests, etc.)
+            f" && {{ cmp -s /tmp/ftl-proxy-ca.crt {system_crt}"
+            f" || {{ cp /tmp/ftl-proxy-ca.crt {system_crt} && update-ca-certificates -q; }}; }}\n"
+            f"{pem}FTLEOF"
         )
         sandbox.exec_as_root(cmds)
 
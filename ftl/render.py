@@ -6,12 +6,17 @@ tool timing updates.
 """
 
 from collections import deque
-import json
 import re
 import sys
 import threading
 import time
 
+try:
+    # orjson parses the per-event lines 2-3x faster; optional.
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 
 class TokenLagWriter:
     """Render text in a fast token-by-token stream with a small trailing lag."""
@@ -65,7 +70,13 @@ class AgentRenderer:
 
     def __init__(self, console, trace_id=None, stream_lag_tokens=15, stream_cadence=0.004):
         self.console = console
-        self._active = None  # {label, t0, stop, thread}
+        self._active = None  # {label, t0}
+        # One ticker thread repaints whichever tool is active, instead of a
+        # thread per tool; the lock keeps a repaint from landing after the
+        # line has been erased.
+        self._ticker = None
+        self._ticker_stop = None
+        self._tick_lock = threading.Lock()
         self._trace_id = trace_id
         self._stream = getattr(console, "file", sys.stdout)
         self._text = TokenLagWriter(
@@ -80,8 +91,8 @@ class AgentRenderer:
         if not line:
             return
         try:
-            event = json.loads(line)
-        except json.JSONDecodeError:
+            event = _json_loads(line)
+        except ValueError:  # json and orjson decode errors both subclass it
             # Non-JSON line (e.g. agent stderr) — print directly
             self._finish_tool()
             self._text.push(line + "\n")
@@ -125,38 +136,51 @@ class AgentRenderer:
 
     def _start_tool(self, block):
         self._text.flush()
-        label = self._label(block)
-        stop = threading.Event()
-        t0 = time.time()
-
-        def _tick():
-            while not stop.wait(timeout=1):
-                elapsed = int(time.time() - t0)
-                self._stream.write(f"\r  ◆ {label}  {elapsed}s")
+        self._active = {"label": self._label(block), "t0": time.time()}
+        if self._ticker is None:
+            self._ticker_stop = threading.Event()
+            self._ticker = threading.Thread(
+                target=self._tick, args=(self._ticker_stop,), daemon=True
+            )
+            self._ticker.start()
+
+    def _tick(self, stop):
+        """Repaint the live counter, writing only when the shown second changes."""
+        shown = None
+        while not stop.wait(timeout=0.25):
+            with self._tick_lock:
+                active = self._active
+                if not active:
+                    continue
+                elapsed = int(time.time() - active["t0"])
+                if elapsed < 1 or (active, elapsed) == shown:
+                    continue
+                shown = (active, elapsed)
+                self._stream.write(f"\r  ◆ {active['label']}  {elapsed}s")
                 self._stream.flush()
 
-        thread = threading.Thread(target=_tick, daemon=True)
-        thread.start()
-        self._active = {"label": label, "t0": t0, "stop": stop}
-
     def _finish_tool(self):
         if not self._active:
             return
         self._text.flush()
-        self._active["stop"].set()
-        elapsed = time.time() - self._active["t0"]
-        self._stream.write("\r\033[K")  # erase the live-counter line
-        self._stream.flush()
-        self.console.print(f"  [dim]◆ {self._active['label']}  {elapsed:.1f}s[/dim]")
+        active = self._active
+        elapsed = time.time() - active["t0"]
+        with self._tick_lock:
+            self._active = None
+            self._stream.write("\r\033[K")  # erase the live-counter line
+            self._stream.flush()
+        self.console.print(f"  [dim]◆ {active['label']}  {elapsed:.1f}s[/dim]")
         if self._trace_id:
             from ftl import cloudwatch
-            cloudwatch.emit(self._trace_id, "tool", self._active["label"],
+            cloudwatch.emit(self._trace_id, "tool", active["label"],
                             elapsed_ms=elapsed * 1000)
-        self._active = None
 
     def finish(self):
         """Call after exec_stream returns to clean up any open tool state."""
         self._finish_tool()
+        if self._ticker is not None:
+            self._ticker_stop.set()
+            self._ticker = None
         self._text.flush()
         if not self._text.ends_on_newline:
             self._stream.write("\n")
@@ -49,3 +49,29 @@ class Sandbox(ABC):
         Optional — not all backends support root exec. Default raises NotImplementedError.
         """
         raise NotImplementedError(f"{type(self).__name__} does not support exec_as_root")
+
+    def write_file(self, path, data):
+        """Write bytes to a file inside the sandbox, creating parent directories.
+
+        Backends should override this with a direct transfer. The default goes
+        through exec() with a heredoc, so it only suits text without an
+        FTLEOF line. Returns (exit_code, stdout, stderr).
+        """
+        text = data.decode() if isinstance(data, bytes) else data
+        return self.exec(f"mkdir -p $(dirname {path}) && cat > {path} << 'FTLEOF'\n{text}\nFTLEOF")
+
+    def workspace_generation(self):
+        """Return a counter that changes whenever the workspace may have been written.
+
+        Optional — backends that can't track writes return None, which disables
+        diff caching for that sandbox.
+        """
+        return None
+
+    def workspace_fingerprint(self):
+        """Return a digest of workspace file paths, sizes and mtimes.
+
+        Optional — lets callers reuse a cached diff when execs bumped the
+        generation without touching any files. Default returns None.
+        """
+        return None
@@ -1,11 +1,23 @@
 import atexit
 import hashlib
-import json
+import os
+import selectors
+import shlex
 import subprocess
+import tarfile
 import threading
+import time
+from collections import defaultdict, deque
 from pathlib import Path
+from ftl.languages import WARM_PYTEST_CLIENT
 from ftl.sandbox.base import Sandbox
 
+try:
+    # orjson parses the diff change list faster; optional.
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 try:
     import fcntl
     _FCNTL_AVAILABLE = True
@@ -21,30 +33,49 @@ AGENT_IMAGES = {
 _DEFAULT_IMAGE = f"{_REGISTRY}:latest"
 ENV_FILE = "/tmp/.ftl_env"
 DEFAULT_TIMEOUT = 3600  # 60 minutes (matches agent timeout)
+_STREAM_BUFFER_CAP = 1 << 20  # chars of exec_stream output kept for the return value
+_verified_images = set()  # images _check_image_exists() has already found
+_STANDBY_MAX = 2  # warm containers kept per project + image
+_STANDBY_TTL = 300  # seconds before surplus warm containers are removed
 
 # Python script run inside the container to compare /workspace against the snapshot.
 # Uses a precomputed snapshot manifest so the hot path is one workspace walk plus
 # selective reads for changed files.
 _DIFF_SCRIPT_TMPL = """\
-import os, json, base64
+import io, os, json, stat, sys, tarfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+try:
+    from orjson import dumps
+except ImportError:
+    def dumps(obj):
+        return json.dumps(obj).encode()
 
-SNAP = Path('/mnt/snapshots/{snapshot_id}')
+SNAP = Path('/mnt/snapshots') / sys.argv[1]
 WORK = Path('/workspace')
 MANIFEST = SNAP / '.ftl_manifest'
+WATCH = '{watch_dir}'
 IGNORE = {{'__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache',
            'node_modules', 'site-packages', 'venv', '.venv'}}
 SUFFIXES = ('.dist-info', '.egg-info', '.egg-link')
-SKIP_FILES = {{'_ftl_test.py', '_ftl_test.js', '.ftl_meta', '.ftl_manifest'}}
+SKIP_FILES = {{'_ftl_test.py', '_ftl_test.js', '_ftl_test.ts', '_ftl_test.cpp',
+              'ftl_generated_check.go', 'FtlGeneratedTest.java',
+              '.ftl_meta', '.ftl_manifest'}}
 
+# Called once per manifest line, so plain string splitting rather than Path.
 def skip(rel):
-    p = Path(rel)
-    if p.name in SKIP_FILES:
+    parts = rel.split('/')
+    if parts[-1] in SKIP_FILES:
         return True
-    for part in p.parts:
-        if part in IGNORE or part.endswith(tuple(SUFFIXES)):
-            return True
-    return False
+    return any(part in IGNORE or part.endswith(SUFFIXES) for part in parts)
+
+# Output is a tar stream: one member per created/modified file, written as soon
+# as it's read, then a trailing JSON list of changes in the same order — raw
+# bytes, no base64 inflation, and no need to hold every file before sending.
+def add(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
 
 snap_meta = {{}}
 try:
@@ -58,44 +89,365 @@ try:
                 continue
             snap_meta[rel] = (int(size), int(mtime_ns))
 except OSError:
-    print('[]')
+    with tarfile.open(fileobj=sys.stdout.buffer, mode='w|') as tar:
+        add(tar, '.ftl_diff', b'[]')
     raise SystemExit(0)
 
-work_meta = {{}}
-for f in WORK.rglob('*'):
-    if not f.is_file():
-        continue
-    rel = str(f.relative_to(WORK))
-    if skip(rel):
-        continue
+# Paths the workspace watcher saw touched, or None to fall back to a full walk.
+# The record is trusted only from a root-owned directory nobody else can write
+# to; anything the agent could edit would let it hide changes from the diff.
+def hinted_paths():
     try:
-        stat = f.stat()
-    except OSError:
-        continue
-    work_meta[rel] = (stat.st_size, stat.st_mtime_ns)
+        st = os.stat(WATCH)
+        if st.st_uid != 0 or st.st_mode & 0o022:
+            return None
+        with open(WATCH + '/state') as f:
+            if f.read() != 'ready':
+                return None
+        with open(WATCH + '/pid') as f:
+            with open('/proc/%d/cmdline' % int(f.read()), 'rb') as cmdline:
+                if WATCH.encode() not in cmdline.read():
+                    return None
+        with open(WATCH + '/changed', 'rb') as f:
+            records = f.read().split(b'\\0')
+    except (OSError, ValueError):
+        return None
+    if records.pop():
+        return None  # torn trailing record
+    return {{r.decode('utf-8', 'surrogateescape') for r in records}}
 
-results = []
-for rel in sorted(snap_meta.keys() - work_meta.keys()):
-    results.append({{'path': rel, 'deleted': True}})
-for rel in sorted(work_meta.keys() - snap_meta.keys()):
+# Full walk: scandir with ignored directories pruned before descending, so
+# node_modules/venv are never listed and no Path is built per entry.
+def walk():
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(WORK, rel_dir))
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                name = entry.name
+                if name in IGNORE or name.endswith(SUFFIXES):
+                    continue
+                rel = rel_dir + name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(rel + '/')
+                        continue
+                    if name in SKIP_FILES:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    yield rel, (st.st_size, st.st_mtime_ns)
+
+hints = hinted_paths()
+if hints is None:
+    work_meta = dict(walk())
+else:
+    # A trailing slash marks a removed or moved-away directory (or a new
+    # ignored one, which matches nothing in the manifest).
+    prefixes = tuple(h for h in hints if h.endswith('/'))
+    candidates = {{h for h in hints if not h.endswith('/')}}
+    if prefixes:
+        candidates.update(rel for rel in snap_meta if rel.startswith(prefixes))
+    snap_meta = {{rel: snap_meta[rel] for rel in candidates if rel in snap_meta}}
+
+    work_meta = {{}}
+    for rel in candidates:
+        if skip(rel):
+            continue
+        try:
+            st = os.stat(WORK / rel)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            work_meta[rel] = (st.st_size, st.st_mtime_ns)
+
+def read(rel):
     try:
-        content = open(WORK / rel, 'rb').read()
-        results.append({{'path': rel, 'deleted': False, 'exists_in_snapshot': False,
-                         'content_b64': base64.b64encode(content).decode()}})
+        with open(WORK / rel, 'rb') as f:
+            return f.read()
     except OSError:
-        pass
-for rel in sorted(snap_meta.keys() & work_meta.keys()):
-    if snap_meta[rel] != work_meta[rel]:
+        return None
+
+results = [{{'path': rel, 'deleted': True}}
+           for rel in sorted(snap_meta.keys() - work_meta.keys())]
+changed = [(rel, False) for rel in sorted(work_meta.keys() - snap_meta.keys())]
+# Filter before sorting: only the handful of modified paths get ordered, not
+# every file the snapshot and workspace share.
+changed += sorted((rel, True) for rel, meta in work_meta.items()
+                  if rel in snap_meta and snap_meta[rel] != meta)
+# Reads release the GIL, so a few threads overlap disk waits across files.
+with ThreadPoolExecutor(max_workers=max(1, min(8, len(changed)))) as ex, \\
+        tarfile.open(fileobj=sys.stdout.buffer, mode='w|') as tar:
+    for (rel, in_snap), content in zip(changed, ex.map(read, [rel for rel, _ in changed])):
+        if content is not None:
+            results.append({{'path': rel, 'deleted': False, 'exists_in_snapshot': in_snap}})
+            add(tar, rel, content)
+    # The trailing member's name tells the host whether the watcher's record
+    # was live; if so it can skip its own stat fingerprint next time.
+    add(tar, '.ftl_diff' if hints is None else '.ftl_diff.hinted', dumps(results))
+"""
+
+# Python script run inside the container after each workspace refresh. It keeps
+# an inotify watch on /workspace and appends every touched path to WATCH/changed,
+# so the diff script can stat just those paths instead of walking the tree.
+# Anything it can't track (queue overflow, watch limit) flips WATCH/state to
+# "overflow" and the diff script falls back to the full walk. WATCH is
+# root-owned and the watcher runs as root: the diff and the reuse check trust
+# its record, so the agent must not be able to edit it.
+_WATCH_DIR = "/var/lib/ftl/watch"
+_WATCH_SCRIPT_TMPL = """\
+import ctypes, errno, os, struct
+
+SNAP = '/mnt/snapshots/{snapshot_id}'
+WORK = '/workspace'
+WATCH = '{watch_dir}'
+IGNORE = {{'__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache',
+           'node_modules', 'site-packages', 'venv', '.venv'}}
+SUFFIXES = ('.dist-info', '.egg-info', '.egg-link')
+# modify | attrib | close_write | moved_from | moved_to | create | delete | onlydir
+# | dont_follow
+MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x1000000 | 0x2000000
+ADDED, REMOVED = 0x80 | 0x100, 0x40 | 0x200
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+
+libc = ctypes.CDLL(None, use_errno=True)
+out = os.open(WATCH + '/changed', os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+dirs = {{}}
+
+def give_up():
+    with open(WATCH + '/state', 'w') as f:
+        f.write('overflow')
+    raise SystemExit(0)
+
+def note(rel, entry=None):
+    os.write(out, rel.encode('utf-8', 'surrogateescape') + b'\\0')
+
+def watch(rel, seed):
+    stack = [rel]
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(WORK, rel)
+        wd = libc.inotify_add_watch(fd, path.encode('utf-8', 'surrogateescape'), MASK)
+        if wd < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                continue
+            give_up()
+        dirs[wd] = rel
         try:
-            content = open(WORK / rel, 'rb').read()
-            results.append({{'path': rel, 'deleted': False, 'exists_in_snapshot': True,
-                             'content_b64': base64.b64encode(content).decode()}})
+            with os.scandir(path) as it:
+                for entry in it:
+                    child = os.path.join(rel, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in IGNORE and not entry.name.endswith(SUFFIXES):
+                            stack.append(child)
+                    else:
+                        seed(child, entry)
         except OSError:
             pass
 
-print(json.dumps(results))
+fd = libc.inotify_init()
+if fd < 0:
+    give_up()
+
+manifest = {{}}
+try:
+    with open(SNAP + '/.ftl_manifest', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\\n')
+            if line:
+                rel, size, mtime_ns = line.split('\\t')
+                manifest[rel] = (int(size), int(mtime_ns))
+except (OSError, ValueError):
+    give_up()
+
+# Seed with anything already differing from the snapshot: the watch on each
+# directory is added before it's listed, so no write falls between the two.
+seen = set()
+
+def seed_initial(rel, entry):
+    seen.add(rel)
+    try:
+        st = entry.stat()
+    except OSError:
+        return
+    if manifest.get(rel) != (st.st_size, st.st_mtime_ns):
+        note(rel)
+
+watch('', seed_initial)
+for rel in manifest.keys() - seen:
+    note(rel)
+with open(WATCH + '/state', 'w') as f:
+    f.write('ready')
+
+while True:
+    buf = os.read(fd, 1 << 16)
+    off = 0
+    while off < len(buf):
+        wd, mask, _cookie, size = struct.unpack_from('iIII', buf, off)
+        name = buf[off + 16:off + 16 + size].rstrip(b'\\0').decode('utf-8', 'surrogateescape')
+        off += 16 + size
+        if mask & IN_Q_OVERFLOW:
+            give_up()
+        if mask & IN_IGNORED:
+            dirs.pop(wd, None)
+            continue
+        base = dirs.get(wd)
+        if base is None or not name:
+            continue
+        rel = os.path.join(base, name)
+        if not mask & IN_ISDIR:
+            note(rel)
+        elif name in IGNORE or name.endswith(SUFFIXES):
+            # Not tracked, but the workspace is no longer a pristine copy.
+            if mask & ADDED:
+                note(rel + '/')
+        elif mask & ADDED:
+            watch(rel, note)
+        elif mask & REMOVED:
+            note(rel + '/')
+"""
+
+# The diff script is installed once per container rather than uploaded on every
+# get_diff(). It lives in a root-owned directory so the agent, running as ftl,
+# can't alter what reports its changes, and is named by content so a container
+# reused across ftl versions never runs a stale copy.
+_DIFF_SCRIPT = _DIFF_SCRIPT_TMPL.format(watch_dir=_WATCH_DIR)
+_DIFF_SCRIPT_PATH = (
+    "/usr/local/lib/ftl/diff-"
+    f"{hashlib.blake2b(_DIFF_SCRIPT.encode(), digest_size=8).hexdigest()}.py"
+)
+
+# Pre-forked pytest server: imports pytest once, then forks a child per run so
+# test cycles skip interpreter start-up and the pytest import. The client hands
+# over its stdio fds, environment and cwd, and relays the child's exit code.
+_PYTEST_SERVER_SCRIPT = """\
+import importlib, importlib.metadata, importlib.util, json, os, signal, socket, struct, sys
+import pytest
+from _pytest.config import default_plugins
+
+# Most of a cold run is importing pytest's own plugins and installed pytest11
+# plugins; import them here so every forked child finds them in sys.modules.
+# Preloaded plugin packages miss assertion rewriting (only their own asserts),
+# so children silence the resulting PytestAssertRewriteWarning.
+for name in default_plugins:
+    try:
+        importlib.import_module('_pytest.' + name)
+    except Exception:
+        pass
+
+# The server outlives workspace refreshes, so a plugin editable-installed from
+# /workspace is left for each child to import fresh rather than frozen here.
+# find_spec on a top-level name locates it without importing anything.
+def in_workspace(module):
+    try:
+        spec = importlib.util.find_spec(module.split('.')[0])
+    except Exception:
+        return True
+    if spec is None:
+        return True
+    paths = [spec.origin or ''] + list(spec.submodule_search_locations or [])
+    return any(os.path.realpath(p).startswith('/workspace/') for p in paths if p)
+
+for ep in importlib.metadata.entry_points(group='pytest11'):
+    try:
+        if not in_workspace(ep.module):
+            ep.load()
+    except Exception:
+        pass
+
+SOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sock')
+
+probe = socket.socket(socket.AF_UNIX)
+try:
+    probe.connect(SOCK)
+    raise SystemExit(0)  # already serving
+except OSError:
+    pass
+finally:
+    probe.close()
+try:
+    os.unlink(SOCK)
+except FileNotFoundError:
+    pass
+
+server = socket.socket(socket.AF_UNIX)
+server.bind(SOCK)
+os.chmod(SOCK, 0o600)
+server.listen(8)
+signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # children are never waited on
+
+def recv_exact(conn, n):
+    data = b''
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+while True:
+    conn, _ = server.accept()
+    if os.fork():
+        conn.close()
+        continue
+    server.close()
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    header, fds, _flags, _addr = socket.recv_fds(conn, 4, 3)
+    request = json.loads(recv_exact(conn, struct.unpack('!I', header)[0]))
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.environ.clear()
+    os.environ.update(request['env'])
+    os.chdir(request['cwd'])
+    sys.path[0] = request['cwd']  # what `python -m pytest` would put there
+    code = 1
+    try:
+        code = int(pytest.main(['-W', 'ignore::pytest.PytestAssertRewriteWarning'] + request['args']))
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        conn.sendall(b'%d' % code)
+        os._exit(0)
+"""
+
+_PYTEST_CLIENT_SCRIPT = """\
+import json, os, socket, struct, sys
+
+SOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sock')
+args = sys.argv[1:]
+
+conn = socket.socket(socket.AF_UNIX)
+try:
+    conn.connect(SOCK)
+except OSError:
+    os.execvp('python', ['python', '-m', 'pytest'] + args)
+
+body = json.dumps({'args': args, 'env': dict(os.environ), 'cwd': os.getcwd()}).encode()
+socket.send_fds(conn, [struct.pack('!I', len(body))], [0, 1, 2])
+conn.sendall(body)
+reply = b''
+while True:
+    chunk = conn.recv(16)
+    if not chunk:
+        break
+    reply += chunk
+sys.exit(int(reply) if reply else 1)
 """
 
+# Directory names skipped by workspace_fingerprint(), mirroring IGNORE above.
+_FINGERPRINT_PRUNE = (
+    "__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache",
+    "node_modules", "site-packages", "venv", ".venv",
+    "*.dist-info", "*.egg-info",
+)
+
 
 def _container_file(project_path, image):
     """Path to the persisted container ID file for this project + image combo."""
@@ -113,8 +465,29 @@ def _container_lock_file(project_path, image):
     return container_dir / f"{slug}.lock"
 
 
+def _clone_cmd(snapshot_id, flags):
+    """Shell command copying a snapshot into /workspace, sharing extents where possible.
+
+    Falls back to a plain copy if this cp doesn't understand --reflink.
+    """
+    src = f"/mnt/snapshots/{snapshot_id}/. /workspace/"
+    return f"{{ cp {flags} --reflink=auto {src} 2>/dev/null || cp {flags} {src}; }}"
+
+
+def _env_file_cmd(all_env):
+    """Shell heredoc writing all_env to ENV_FILE as export lines."""
+    env_lines = "\n".join(f"export {k}='{v}'" for k, v in all_env.items())
+    return f"cat > {ENV_FILE} << 'FTLEOF'\n{env_lines}\nFTLEOF"
+
+
 def _check_image_exists(image):
-    """Check Docker is running and the required image exists locally."""
+    """Check Docker is running and the required image exists locally.
+
+    A positive result is remembered for the life of the process; images don't
+    vanish mid-session, and `ftl setup` runs as its own process anyway.
+    """
+    if image in _verified_images:
+        return
     result = subprocess.run(
         ["docker", "images", "-q", image],
         capture_output=True,
@@ -129,11 +502,114 @@ def _check_image_exists(image):
         raise RuntimeError(
             f"Docker image '{image}' not found. Run 'ftl setup' or: docker pull {image}"
         )
+    _verified_images.add(image)
+
+
+class _PersistentShell:
+    """One long-lived `docker exec -i <id> sh` that runs commands back to back.
+
+    Each command runs in a subshell with stdin from /dev/null, followed by a
+    random end marker (carrying $?) on stdout and stderr. Reading up to both
+    markers splits the streams back into per-command results, so the
+    exec/shim setup cost is paid once instead of per command.
+    """
+
+    def __init__(self, container_id):
+        self.container_id = container_id
+        self.lock = threading.Lock()
+        self.proc = subprocess.Popen(
+            ["docker", "exec", "-i", container_id, "sh"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, command, timeout):
+        """Return (exit_code, stdout, stderr).
+
+        Raises TimeoutError; OSError if the command never reached the shell;
+        EOFError if the shell failed after it was sent, when some or all of
+        the command may already have run.
+        """
+        marker = f"__FTL_END_{os.urandom(8).hex()}__".encode()
+        try:
+            self.proc.stdin.write(
+                b"(\n" + command.encode() + b"\n) </dev/null\n"
+                b"printf '\\n" + marker + b"%d\\n' $?\n"
+                b"printf '\\n" + marker + b"\\n' >&2\n"
+            )
+            self.proc.stdin.flush()
+        except ValueError as e:  # stdin already closed
+            raise OSError("persistent shell closed") from e
+        try:
+            return self._read_result(marker, timeout)
+        except TimeoutError:
+            raise
+        except (OSError, ValueError) as e:
+            raise EOFError(f"persistent shell failed mid-command: {e}") from e
+
+    def _read_result(self, marker, timeout):
+        """Read both streams up to marker and split out the command's result."""
+        bufs = {self.proc.stdout: bytearray(), self.proc.stderr: bytearray()}
+        starts, ends = {}, {}
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as sel:
+            for stream in bufs:
+                sel.register(stream, selectors.EVENT_READ)
+            while len(ends) < 2:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                for key, _ in sel.select(remaining):
+                    stream = key.fileobj
+                    chunk = os.read(stream.fileno(), 65536)
+                    if not chunk:
+                        raise OSError("persistent shell exited")
+                    buf = bufs[stream]
+                    buf += chunk
+                    # The marker follows a newline we printed, so it can only
+                    # match at the start of a line of our own output. Only the
+                    # new tail is searched, so large outputs stay linear.
+                    start = starts.get(stream, -1)
+                    if start < 0:
+                        tail = max(0, len(buf) - len(chunk) - len(marker))
+                        start = buf.find(b"\n" + marker, tail)
+                        starts[stream] = start
+                    end = buf.find(b"\n", start + 1) if start >= 0 else -1
+                    if end >= 0:
+                        ends[stream] = (start, buf[start + 1 + len(marker):end])
+                        sel.unregister(stream)
+
+        out_end, code = ends[self.proc.stdout]
+        err_end, _ = ends[self.proc.stderr]
+        return (
+            int(code),
+            bufs[self.proc.stdout][:out_end].decode(errors="replace"),
+            bufs[self.proc.stderr][:err_end].decode(errors="replace"),
+        )
+
+    def close(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass  # stdin can't flush into a dead shell
 
 
 class DockerSandbox(Sandbox):
 
-    _standby_id = None
+    # Warm containers, oldest first, keyed by (project_path, image): deque of
+    # (container_id, released_at, fresh). fresh marks a pre-warmed container
+    # that has never been set up.
+    _standby_pool = defaultdict(deque)
+    _prewarming = set()  # pool keys with a replacement container being created
+    _reaper = None
     _lock = threading.Lock()
 
     def __init__(self, image=None, agent_name=None):
@@ -144,6 +620,11 @@ class DockerSandbox(Sandbox):
         self._credentials = {}
         self._agent_env = {}
         self._project_path = None
+        self._generation = 0  # bumped after every exec that may write /workspace
+        self._shell = None  # _PersistentShell reused by exec()
+        self._shell_guard = threading.Lock()
+        self._diff_installed = None  # container the diff script is known to exist in
+        self._watch_live = None  # container whose last diff used the watcher's record
         atexit.register(self._cleanup_on_exit)
 
     def boot(self, snapshot_path, credentials=None, agent_env=None, project_path=None,
@@ -167,54 +648,77 @@ class DockerSandbox(Sandbox):
 
         # 1. Check disk for a persisted container for this project.
         #    Use a file lock so two concurrent sessions for the same project
-        #    can't both claim the same container (race condition).
+        #    can't both claim the same container (race condition). The warm
+        #    pool is checked in the same `docker inspect` — each call is a
+        #    daemon round trip, slow on Docker Desktop.
         existing_id = None
+        pool_key = (self._project_path, self.image)
+        with DockerSandbox._lock:
+            pooled = {cid for cid, *_ in DockerSandbox._standby_pool[pool_key]}
+        alive = None
         if self._project_path:
             cfile = _container_file(self._project_path, self.image)
             lock_path = _container_lock_file(self._project_path, self.image)
-            lock_fd = open(lock_path, "w")
-            try:
+            # Closing the file drops the flock, so the with block is the
+            # whole critical section.
+            with open(lock_path, "w") as lock_fd:
                 if _FCNTL_AVAILABLE:
                     fcntl.flock(lock_fd, fcntl.LOCK_EX)
-                if cfile.exists():
+                try:
                     stored = cfile.read_text().strip()
-                    if stored and self._is_alive(stored):
+                except FileNotFoundError:
+                    stored = None
+                if stored is not None:
+                    alive = self._alive_ids(stored, *pooled)
+                    if stored and stored in alive:
                         existing_id = stored
-                        # Claim it by removing the file — the next caller
-                        # won't see it and will create a fresh container.
-                        cfile.unlink(missing_ok=True)
-                    else:
-                        cfile.unlink(missing_ok=True)  # stale reference
-            finally:
-                if _FCNTL_AVAILABLE:
-                    fcntl.flock(lock_fd, fcntl.LOCK_UN)
-                lock_fd.close()
+                    # Claim it by removing the file — the next caller won't
+                    # see it and will create a fresh container. A dead ID is
+                    # just a stale reference.
+                    cfile.unlink(missing_ok=True)
 
-        # 2. Fall back to in-process standby
-        if existing_id is None:
-            with DockerSandbox._lock:
-                if DockerSandbox._standby_id and self._is_alive(DockerSandbox._standby_id):
-                    existing_id = DockerSandbox._standby_id
-                    DockerSandbox._standby_id = None
+        # 2. Fall back to the in-process warm pool, newest first. A container
+        #    claimed from disk may also sit in the pool; take it out.
+        from_pool = pooled_fresh = False
+        with DockerSandbox._lock:
+            pool = DockerSandbox._standby_pool[pool_key]
+            if existing_id is None:
+                ids = [cid for cid, *_ in pool]
+                if alive is None or not pooled.issuperset(ids):
+                    alive = self._alive_ids(*ids)
+                while pool and existing_id is None:
+                    cid, _, pooled_fresh = pool.pop()
+                    if cid in alive:
+                        existing_id = cid
+                        from_pool = True
+                # Only a long-lived process reuses the pool, so only then is
+                # a replacement worth creating in the background.
+                prewarm = from_pool and not pool and pool_key not in DockerSandbox._prewarming
+                if prewarm:
+                    DockerSandbox._prewarming.add(pool_key)
+            else:
+                prewarm = False
+                pool_entries = [entry for entry in pool if entry[0] != existing_id]
+                pool.clear()
+                pool.extend(pool_entries)
 
-        self.fresh = existing_id is None
+        # Write all env vars to file inside container, in the same exec as the
+        # workspace reset:
+        # - shadow credentials (project secrets the agent sees as fake keys)
+        # - agent auth (ANTHROPIC_API_KEY, etc. so the agent can call its own API)
+        all_env = {**self._credentials, **self._agent_env}
+        self.fresh = existing_id is None or (from_pool and pooled_fresh)
         if existing_id:
             self.container_id = existing_id
-            self._init_workspace(snapshot_id, wipe=True)
+            self._init_workspace(snapshot_id, wipe=True, env=all_env)
         else:
             self.container_id = self._create()
-            self._init_workspace(snapshot_id, wipe=False)
+            self._init_workspace(snapshot_id, wipe=False, env=all_env)
 
         # Persist so the next `ftl code` invocation can reuse this container
         if self._project_path:
             _container_file(self._project_path, self.image).write_text(self.container_id)
 
-        # Write all env vars to file inside container:
-        # - shadow credentials (project secrets the agent sees as fake keys)
-        # - agent auth (ANTHROPIC_API_KEY, etc. so the agent can call its own API)
-        all_env = {**self._credentials, **self._agent_env}
-        self._write_env_file(all_env)
-
         # Run setup command on fresh containers only — installs project deps that
         # will persist in /home/ftl/.local/ for the lifetime of this container.
         if self.fresh and setup_cmd:
@@ -223,9 +727,23 @@ class DockerSandbox(Sandbox):
         # Pre-warm the selected agent runtime in the background so first-task
         # startup cost is paid before the user sees agent output.
         threading.Thread(target=self._prewarm_agent, daemon=True).start()
+        threading.Thread(target=self._start_pytest_server, daemon=True).start()
+        if prewarm:
+            threading.Thread(target=self._prewarm_standby, args=(pool_key,), daemon=True).start()
 
         return self.container_id
 
+    def _prewarm_standby(self, pool_key):
+        """Create a replacement warm container so the next boot() skips `docker run`."""
+        try:
+            cid = self._create()
+        except (OSError, subprocess.CalledProcessError):
+            cid = None
+        with DockerSandbox._lock:
+            DockerSandbox._prewarming.discard(pool_key)
+            if cid:
+                DockerSandbox._standby_pool[pool_key].append((cid, time.monotonic(), True))
+
     def prepare(self, snapshot_path, credentials=None, agent_env=None, setup_cmd=None):
         """Refresh the workspace and env inside an already-running container."""
         if not self.container_id:
@@ -234,8 +752,10 @@ class DockerSandbox(Sandbox):
         snapshot_path = Path(snapshot_path).resolve()
         self._credentials = credentials or {}
         self._agent_env = agent_env or {}
-        self._write_env_file({**self._credentials, **self._agent_env})
-        self._init_workspace(snapshot_path.name, wipe=True)
+        self._init_workspace(
+            snapshot_path.name, wipe=True, env={**self._credentials, **self._agent_env}
+        )
+        self._generation += 1
 
     def _with_env(self, cmd):
         """Prepend ENV_FILE sourcing if any credentials/agent env are configured."""
@@ -243,16 +763,29 @@ class DockerSandbox(Sandbox):
             return f". {ENV_FILE} && {cmd}"
         return cmd
 
-    def _write_env_file(self, all_env):
-        env_lines = "\n".join(f"export {k}='{v}'" for k, v in all_env.items())
-        subprocess.run(
-            ["docker", "exec", self.container_id, "sh", "-c",
-             f"cat > {ENV_FILE} << 'FTLEOF'\n{env_lines}\nFTLEOF"],
-            capture_output=True,
-        )
-
     def exec(self, command, timeout=DEFAULT_TIMEOUT):
-        """Run a command inside the container with credentials sourced."""
+        """Run a command inside the container with credentials sourced.
+
+        Goes through the persistent shell when it's free; concurrent callers
+        (and a shell that fails before taking the command) fall back to a
+        one-off docker exec. A command the shell already took is never rerun,
+        since it may have partly run.
+        """
+        shell = self._claim_shell()
+        if shell is not None:
+            try:
+                return shell.run(self._with_env(command), timeout)
+            except TimeoutError:
+                self._drop_shell(shell)
+                return 124, "", f"Command timed out after {timeout}s"
+            except EOFError as e:
+                self._drop_shell(shell)
+                return 1, "", str(e)
+            except OSError:
+                self._drop_shell(shell)
+            finally:
+                shell.lock.release()
+                self._generation += 1
         try:
             result = subprocess.run(
                 ["docker", "exec", self.container_id, "sh", "-c", self._with_env(command)],
@@ -262,9 +795,29 @@ class DockerSandbox(Sandbox):
             )
         except subprocess.TimeoutExpired:
             return 124, "", f"Command timed out after {timeout}s"
+        finally:
+            self._generation += 1
 
         return result.returncode, result.stdout, result.stderr
 
+    def write_file(self, path, data):
+        """Pipe bytes straight into a file in the container over docker exec stdin.
+
+        No shell quoting or heredoc, so content is written byte-for-byte.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            result = subprocess.run(
+                ["docker", "exec", "-i", self.container_id, "sh", "-c",
+                 'mkdir -p "$(dirname "$1")" && cat > "$1"', "sh", path],
+                input=data,
+                capture_output=True,
+            )
+        finally:
+            self._generation += 1
+        return result.returncode, "", result.stderr.decode(errors="replace")
+
     def exec_stream(self, command, callback=None, timeout=DEFAULT_TIMEOUT):
         """Run a command inside the container, streaming output line-by-line.
 
@@ -277,17 +830,59 @@ class DockerSandbox(Sandbox):
             stderr=subprocess.STDOUT,
             text=True,
         )
-        lines = []
+        # Every line reaches the callback, but only the head and tail are kept
+        # for the return value so a chatty agent can't balloon host memory.
+        half = _STREAM_BUFFER_CAP // 2
+        head, tail = [], deque()
+        head_size = tail_size = dropped = 0
         try:
             for line in proc.stdout:
-                lines.append(line)
+                if head_size < half:
+                    head.append(line)
+                    head_size += len(line)
+                else:
+                    tail.append(line)
+                    tail_size += len(line)
+                    while tail_size > half and len(tail) > 1:
+                        tail_size -= len(tail.popleft())
+                        dropped += 1
                 if callback:
                     callback(line)
         except KeyboardInterrupt:
             proc.terminate()
             raise
+        finally:
+            self._generation += 1
         proc.wait()
-        return proc.returncode, "".join(lines), ""
+        marker = [f"... [{dropped} lines truncated] ...\n"] if dropped else []
+        return proc.returncode, "".join(head + marker + list(tail)), ""
+
+    def workspace_generation(self):
+        """Return the exec counter — unchanged means /workspace hasn't been touched."""
+        return self._generation
+
+    def workspace_fingerprint(self):
+        """Hash a stat listing of /workspace (same prunes as the diff script).
+
+        Runs outside exec() so it doesn't bump the generation it's meant to
+        second-guess. Returns None while the in-container watcher is live: the
+        diff script then only stats the paths it recorded, so a separate walk
+        of every file would cost more than the diff it's meant to save.
+        """
+        if self._watch_live == self.container_id:
+            return None
+        prune = " -o ".join(f"-name '{name}'" for name in _FINGERPRINT_PRUNE)
+        cmd = (
+            f"find /workspace -mindepth 1 \\( {prune} \\) -prune -o "
+            "-type f -printf '%P\\t%s\\t%T@\\n' | sort"
+        )
+        result = subprocess.run(
+            ["docker", "exec", self.container_id, "sh", "-c", cmd],
+            capture_output=True,
+        )
+        if result.returncode != 0:
+            return None
+        return hashlib.blake2b(result.stdout, digest_size=16).hexdigest()
 
     def get_diff(self, snapshot_path):
         """Return structured diffs by comparing /workspace against the snapshot.
@@ -296,30 +891,107 @@ class DockerSandbox(Sandbox):
         walking through VirtioFS. Returns the same format as diff.compute_diff().
         """
         snapshot_id = Path(snapshot_path).name
-        script = _DIFF_SCRIPT_TMPL.format(snapshot_id=snapshot_id)
-        cmd = (
-            f"cat > /tmp/_ftl_diff.py << 'PYEOF'\n{script}\nPYEOF\n"
-            "python3 /tmp/_ftl_diff.py\n"
-            "rm -f /tmp/_ftl_diff.py"
+        cmd = f"python3 {_DIFF_SCRIPT_PATH} {shlex.quote(snapshot_id)}"
+        if self._diff_installed != self.container_id:
+            path, tmp = _DIFF_SCRIPT_PATH, f"{_DIFF_SCRIPT_PATH}.$$"
+            cmd = (
+                f"[ -f {path} ] || {{ mkdir -p {os.path.dirname(path)} && "
+                f"cat > {tmp} << 'PYEOF' && mv {tmp} {path}; }}\n{_DIFF_SCRIPT}\nPYEOF\n{cmd}"
+            )
+        # Read the script's tar stream as it arrives: file contents first, then
+        # the JSON change list as the last member, listing them in order.
+        proc = subprocess.Popen(
+            ["docker", "exec", "-u", "root", self.container_id, "sh", "-c", cmd],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
         )
-        result = self.exec_as_root(cmd)
         try:
-            overlay_changes = json.loads(result.stdout)
-        except (json.JSONDecodeError, ValueError):
+            with tarfile.open(fileobj=proc.stdout, mode="r|") as tar:
+                members = [(m.name, tar.extractfile(m).read()) for m in tar]
+            name, listing = members.pop()
+            overlay_changes = _json_loads(listing)
+            contents = iter([data for _, data in members])
+        except (tarfile.TarError, IndexError, ValueError):
+            self._diff_installed = None  # reinstall next time in case it went missing
             return []
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        self._diff_installed = self.container_id
+        self._watch_live = self.container_id if name == ".ftl_diff.hinted" else None
+        for change in overlay_changes:
+            if not change["deleted"]:
+                change["content"] = next(contents)
 
         from ftl.diff import compute_diff_from_overlay
         return compute_diff_from_overlay(overlay_changes, snapshot_path)
 
+    def _claim_shell(self):
+        """Return the persistent shell with its lock held, or None if it's busy."""
+        if not self.container_id:
+            return None
+        with self._shell_guard:
+            shell = self._shell
+            if shell is None or shell.container_id != self.container_id or not shell.alive():
+                if shell is not None:
+                    shell.close()
+                try:
+                    shell = self._shell = _PersistentShell(self.container_id)
+                except OSError:
+                    self._shell = None
+                    return None
+        return shell if shell.lock.acquire(blocking=False) else None
+
+    def _drop_shell(self, shell=None):
+        """Kill the persistent shell (or only `shell`, if it's still current)."""
+        with self._shell_guard:
+            if self._shell is not None and shell in (None, self._shell):
+                self._shell.close()
+                self._shell = None
+
     def standby(self):
-        """Release the container — keep it running for reuse (disk + class var)."""
-        with DockerSandbox._lock:
-            DockerSandbox._standby_id = self.container_id
+        """Release the container — keep it running for reuse (disk + warm pool).
+
+        Each project + image keeps at most _STANDBY_MAX warm containers, so
+        concurrent sessions can each pick one up; the oldest beyond that are
+        removed. A reaper thread trims pools back to one container once the
+        extras have sat idle for _STANDBY_TTL.
+        """
+        self._drop_shell()
+        surplus = []
+        if self.container_id:
+            with DockerSandbox._lock:
+                pool = DockerSandbox._standby_pool[(self._project_path, self.image)]
+                pool.append((self.container_id, time.monotonic(), False))
+                while len(pool) > _STANDBY_MAX:
+                    surplus.append(pool.popleft()[0])
+                if DockerSandbox._reaper is None:
+                    DockerSandbox._reaper = threading.Thread(
+                        target=DockerSandbox._reap_standby, daemon=True
+                    )
+                    DockerSandbox._reaper.start()
+        if surplus:
+            subprocess.run(["docker", "rm", "-f", *surplus], capture_output=True)
         # Disk file already written in boot(); nothing more to do here
         self.container_id = None
 
+    @classmethod
+    def _reap_standby(cls):
+        """Remove warm containers idle past _STANDBY_TTL, keeping the newest per pool."""
+        while True:
+            time.sleep(_STANDBY_TTL / 4)
+            cutoff = time.monotonic() - _STANDBY_TTL
+            stale = []
+            with cls._lock:
+                for pool in cls._standby_pool.values():
+                    while len(pool) > 1 and pool[0][1] < cutoff:
+                        stale.append(pool.popleft()[0])
+            if stale:
+                subprocess.run(["docker", "rm", "-f", *stale], capture_output=True)
+
     def destroy(self):
         """Kill and remove the container."""
+        self._drop_shell()
         if self.container_id:
             subprocess.run(
                 ["docker", "rm", "-f", self.container_id],
@@ -369,6 +1041,23 @@ class DockerSandbox(Sandbox):
         )
         return result
 
+    def _start_pytest_server(self):
+        """Install the warm pytest client and start its fork server (idempotent)."""
+        if not self.container_id:
+            return
+        pytest_dir = os.path.dirname(WARM_PYTEST_CLIENT)
+        cmd = (
+            f"mkdir -p {pytest_dir} && "
+            f"cat > {pytest_dir}/server.py << 'PYEOF'\n{_PYTEST_SERVER_SCRIPT}\nPYEOF\n"
+            f"cat > {WARM_PYTEST_CLIENT} << 'PYEOF'\n{_PYTEST_CLIENT_SCRIPT}\nPYEOF\n"
+            f"python {pytest_dir}/server.py > /dev/null 2>&1 < /dev/null &"
+        )
+        subprocess.run(
+            ["docker", "exec", self.container_id, "sh", "-c", cmd],
+            capture_output=True,
+            timeout=30,
+        )
+
     def _prewarm_agent(self):
         """Run the selected agent's lightweight warm-up command inside the sandbox."""
         from ftl.agents import get_agent
@@ -383,61 +1072,138 @@ class DockerSandbox(Sandbox):
             timeout=30,
         )
 
-    def _init_workspace(self, snapshot_id, wipe=False):
+    def _init_workspace(self, snapshot_id, wipe=False, env=None):
         """Populate /workspace from snapshot. If wipe=True, clears it first.
 
-        Fast path runs as the unprivileged sandbox user so we avoid a recursive
-        root-owned copy + chown on every refresh. Older containers may still
-        have root-owned files, so we fall back to the original root path only if
-        the user-level refresh fails.
+        If env is given, ENV_FILE is rewritten in the same exec.
+
+        Runs as one root exec, but the copy itself runs as the unprivileged
+        sandbox user (via runuser) so we avoid a recursive root-owned copy +
+        chown on every refresh. Older containers may still have root-owned
+        files, so we fall back to the original root path only if the
+        user-level refresh fails.
+
+        An overlay mount (snapshot as lowerdir) would make this O(1), but needs
+        CAP_SYS_ADMIN, which the sandbox deliberately doesn't get; a symlink
+        farm into the read-only snapshot mount would break in-place writes.
+        Hardlinks (`cp -al`) fail the same way: the snapshot is a separate
+        read-only mount, so link() returns EXDEV. `--reflink=auto` shares
+        extents instead when /workspace sits on a CoW filesystem (btrfs/XFS)
+        and degrades to a normal copy elsewhere.
+
+        On reuse, the wipe and copy are skipped entirely when the live watcher
+        has seen nothing change since the last refresh and the new snapshot's
+        manifest matches the one applied then.
         """
+        # The watcher runs as root and keeps its state in a root-owned
+        # directory, so the agent can neither stop it nor rewrite what it has
+        # recorded; only the copy runs as the sandbox user. Stop the previous
+        # watcher before the wipe; a fresh one starts once the workspace is
+        # populated. cp -p keeps mtimes so the manifest comparison in the diff
+        # script and watcher only flags files that really changed.
+        stop_watch = (
+            f"pid=$(cat {_WATCH_DIR}/pid 2>/dev/null) && "
+            f"grep -q {_WATCH_DIR} /proc/$pid/cmdline 2>/dev/null && kill $pid; "
+            f"rm -rf {_WATCH_DIR}"
+        )
+        script = _WATCH_SCRIPT_TMPL.format(snapshot_id=snapshot_id, watch_dir=_WATCH_DIR)
+
+        # The env heredoc has to end its own line, so it leads each script.
+        env_cmd = _env_file_cmd(env) + "\n" if env is not None else ""
         cmds = []
         if wipe:
             cmds.append("find /workspace -mindepth 1 -delete")
         cmds.extend([
-            f"cp -R /mnt/snapshots/{snapshot_id}/. /workspace/",
+            _clone_cmd(snapshot_id, "-pR"),
             "rm -f /workspace/.ftl_meta",
             "rm -f /workspace/.ftl_manifest",
         ])
-
-        user_result = subprocess.run(
-            ["docker", "exec", "-u", "ftl", "-w", "/workspace", self.container_id, "sh", "-c", "; ".join(cmds)],
-            capture_output=True,
-            text=True,
-        )
-        if user_result.returncode == 0:
-            return
-
         root_cmds = []
         if wipe:
             root_cmds.append("find /workspace -mindepth 1 -delete")
         root_cmds.extend([
-            f"cp -a /mnt/snapshots/{snapshot_id}/. /workspace/",
+            _clone_cmd(snapshot_id, "-a"),
             "rm -f /workspace/.ftl_meta",
             "rm -f /workspace/.ftl_manifest",
             "chown -R ftl:ftl /workspace",
         ])
-        root_result = self.exec_as_root("; ".join(root_cmds))
-        if root_result.returncode != 0:
+        if env is not None:
+            root_cmds.append(f"chown ftl:ftl {ENV_FILE}")
+        reset = (
+            f"{stop_watch}; "
+            f"runuser -u ftl -- sh -c {shlex.quote(env_cmd + '; '.join(cmds))} || "
+            f"{{ {env_cmd}{'; '.join(root_cmds)}; }}"
+        )
+        if wipe:
+            # Every input here is root-owned. The new watcher re-seeds against
+            # the manifest, so a wrong guess still shows up in the diff rather
+            # than being lost.
+            unchanged = (
+                f'[ "$(cat {_WATCH_DIR}/state 2>/dev/null)" = ready ] && '
+                f"[ ! -s {_WATCH_DIR}/changed ] && "
+                f"pid=$(cat {_WATCH_DIR}/pid) && "
+                f"grep -q {_WATCH_DIR} /proc/$pid/cmdline 2>/dev/null && "
+                f"cmp -s /mnt/snapshots/$(cat {_WATCH_DIR}/snapshot)/.ftl_manifest "
+                f"/mnt/snapshots/{snapshot_id}/.ftl_manifest"
+            )
+            keep = stop_watch
+            if env is not None:
+                keep += (
+                    f"; runuser -u ftl -- sh -c {shlex.quote(env_cmd)} || "
+                    f"{{ {env_cmd}chown ftl:ftl {ENV_FILE}; }}"
+                )
+            reset = f"if {unchanged}; then {keep}; else {reset}; fi"
+
+        start_watch = (
+            f"mkdir -p {_WATCH_DIR} && "
+            f"cat > {_WATCH_DIR}/watch.py << 'PYEOF'\n{script}\nPYEOF\n"
+            f"python3 {_WATCH_DIR}/watch.py > /dev/null 2>&1 < /dev/null &\n"
+            f"echo $! > {_WATCH_DIR}/pid && "
+            f"echo {snapshot_id} > {_WATCH_DIR}/snapshot"
+        )
+
+        result = self.exec_as_root(reset + " && " + start_watch)
+        if result.returncode != 0:
             raise RuntimeError(
-                "Failed to initialize workspace: "
-                f"{root_result.stderr or root_result.stdout or user_result.stderr or user_result.stdout}"
+                f"Failed to initialize workspace: {result.stderr or result.stdout}"
             )
 
-    def _is_alive(self, container_id):
+    def _alive_ids(self, *container_ids):
+        """Return the subset of container_ids that are running, in one `docker inspect`.
+
+        Missing containers make inspect exit non-zero but the rest are still
+        reported, so the output is parsed regardless of the return code.
+        """
+        ids = [cid for cid in dict.fromkeys(container_ids) if cid]
+        if not ids:
+            return set()
         result = subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", container_id],
+            ["docker", "inspect", "-f", "{{.Id}} {{.State.Running}}", *ids],
             capture_output=True,
             text=True,
         )
-        return result.returncode == 0 and "true" in result.stdout
+        running = [
+            full_id for full_id, _, state in
+            (line.partition(" ") for line in result.stdout.splitlines())
+            if state.strip() == "true"
+        ]
+        return {cid for cid in ids if any(full_id.startswith(cid) for full_id in running)}
 
     def _cleanup_on_exit(self):
         """On process exit, leave containers running — they're reused by the next invocation.
 
         Only clears in-memory references; the disk file written in boot() ensures
-        the container is found again even after the process restarts.
+        the container is found again even after the process restarts. Surplus
+        warm containers beyond the newest per pool would be orphaned, so those
+        are removed.
         """
+        self._drop_shell()
         self.container_id = None
         with DockerSandbox._lock:
-            DockerSandbox._standby_id = None
+            surplus = [
+                cid for pool in DockerSandbox._standby_pool.values()
+                for cid, *_ in list(pool)[:-1]
+            ]
+            DockerSandbox._standby_pool.clear()
+        if surplus:
+            subprocess.run(["docker", "rm", "-f", *surplus], capture_output=True)
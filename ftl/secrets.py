@@ -1,4 +1,61 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _add_secret(secrets, name, val):
+    """Merge one secret into secrets: JSON objects expand, plain strings key on the name."""
+    try:
+        parsed = json.loads(val)
+        if isinstance(parsed, dict):
+            secrets.update({k: str(v) for k, v in parsed.items()})
+            return
+    except (json.JSONDecodeError, TypeError):
+        pass
+    key = name.rstrip("/").split("/")[-1].upper()
+    secrets[key] = val
+
+
+def _batch_fetch(client, prefix):
+    """Fetch secrets 20 at a time with BatchGetSecretValue, filtering server-side."""
+    secrets = {}
+    kwargs = {"Filters": [{"Key": "name", "Values": [prefix]}], "MaxResults": 20}
+    while True:
+        resp = client.batch_get_secret_value(**kwargs)
+        # Per-secret failures land in resp["Errors"]; skip them like the
+        # one-by-one path does.
+        for value in resp["SecretValues"]:
+            if "SecretString" in value:
+                _add_secret(secrets, value["Name"], value["SecretString"])
+        if not resp.get("NextToken"):
+            return secrets
+        kwargs["NextToken"] = resp["NextToken"]
+
+
+def _fetch_each(client, prefix):
+    """List secrets under prefix and fetch each with its own GetSecretValue call.
+
+    The calls are independent round trips, so they run on a small thread pool
+    (botocore clients are thread-safe); results merge in listing order.
+    """
+    paginator = client.get_paginator("list_secrets")
+    listed = [
+        secret
+        for page in paginator.paginate(Filters=[{"Key": "name", "Values": [prefix]}])
+        for secret in page["SecretList"]
+    ]
+
+    def fetch(secret):
+        try:
+            return client.get_secret_value(SecretId=secret["ARN"])["SecretString"]
+        except Exception:
+            return None
+
+    secrets = {}
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        for secret, val in zip(listed, pool.map(fetch, listed)):
+            if val is not None:
+                _add_secret(secrets, secret["Name"], val)
+    return secrets
 
 
 def load_from_secrets_manager(prefix):
@@ -14,23 +71,11 @@ def load_from_secrets_manager(prefix):
     try:
         import boto3
         client = boto3.client("secretsmanager")
-        secrets = {}
-        paginator = client.get_paginator("list_secrets")
-        for page in paginator.paginate(Filters=[{"Key": "name", "Values": [prefix]}]):
-            for secret in page["SecretList"]:
-                try:
-                    val = client.get_secret_value(SecretId=secret["ARN"])["SecretString"]
-                    try:
-                        parsed = json.loads(val)
-                        if isinstance(parsed, dict):
-                            secrets.update({k: str(v) for k, v in parsed.items()})
-                            continue
-                    except (json.JSONDecodeError, TypeError):
-                        pass
-                    key = secret["Name"].rstrip("/").split("/")[-1].upper()
-                    secrets[key] = val
-                except Exception:
-                    pass
-        return secrets
+        try:
+            return _batch_fetch(client, prefix)
+        except Exception:
+            # Older botocore without BatchGetSecretValue, or an IAM policy
+            # that only grants GetSecretValue.
+            return _fetch_each(client, prefix)
     except Exception:
         return {}
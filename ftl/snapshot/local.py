@@ -1,12 +1,17 @@
+import fnmatch
+import os
 import shutil
 import subprocess
+import sys
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from ftl.snapshot.base import SnapshotStore
 from ftl.ignore import get_ignore_set
 
 SNAPSHOT_DIR = Path.home() / ".ftl" / "snapshots"
 MANIFEST_FILE = ".ftl_manifest"
+_LARGE_FILE_BYTES = 100_000_000
 
 # Files/dirs always excluded from snapshots regardless of .ftlignore
 _RSYNC_EXCLUDES = [
@@ -23,6 +28,210 @@ _RSYNC_EXCLUDES = [
     ".ruff_cache",
 ]
 
+_clone_support = {}  # (source st_dev, snapshot st_dev) -> whether cp can clone
+
+
+def _scan_files(root):
+    """Yield (relative_path, DirEntry) for every file under root.
+
+    Uses os.scandir so file type and stat come from the directory read
+    instead of a Path object plus extra stat calls per entry.
+    """
+    stack = [(str(root), "")]
+    while stack:
+        path, prefix = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                rel = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, rel + "/"))
+                elif entry.is_file():
+                    yield rel, entry
+
+
+def _clone_tree(src, dst):
+    """Copy the contents of src into dst with copy-on-write clones where supported.
+
+    cp picks reflinks on btrfs/XFS (--reflink=auto) or clonefile on APFS (-c),
+    making the copy O(metadata) instead of O(bytes). Returns False if cp is
+    unavailable or fails, so the caller can fall back to a per-file copy.
+    """
+    clone_flag = "-c" if sys.platform == "darwin" else "--reflink=auto"
+    try:
+        result = subprocess.run(
+            ["cp", "-a", clone_flag, f"{src}/.", f"{dst}/"],
+            capture_output=True,
+        )
+    except OSError:
+        return False
+    return result.returncode == 0
+
+
+def _can_clone(src_file, dst_dir):
+    """Whether cp can clone (not copy) files from src_file's filesystem into dst_dir.
+
+    Probed once per pair of devices with a real file: on a filesystem without
+    clones, cp --reflink=always over a whole tree fails file by file.
+    """
+    key = (os.stat(src_file).st_dev, os.stat(dst_dir).st_dev)
+    if key not in _clone_support:
+        clone_flag = "-c" if sys.platform == "darwin" else "--reflink=always"
+        probe = Path(dst_dir) / ".ftl_clone_probe"
+        try:
+            result = subprocess.run(
+                ["cp", clone_flag, str(src_file), str(probe)], capture_output=True,
+            )
+            _clone_support[key] = result.returncode == 0
+        except OSError:
+            _clone_support[key] = False
+        probe.unlink(missing_ok=True)
+    return _clone_support[key]
+
+
+def _clone_project(project_path, snapshot_path, ignore_set):
+    """Clone the project into snapshot_path with copy-on-write, applying the excludes.
+
+    Top-level excluded entries are never copied; excluded names deeper down
+    are cloned (metadata only) and then deleted. Returns False without
+    copying anything if clones aren't available, so the caller uses rsync.
+    """
+    if any("/" in p for p in ignore_set):
+        return False  # path patterns: leave the matching to rsync
+    patterns = _RSYNC_EXCLUDES + sorted(ignore_set)
+    with os.scandir(project_path) as it:
+        entries = [
+            e.path for e in it
+            if not any(fnmatch.fnmatchcase(e.name, p) for p in patterns)
+        ]
+    first_file = next((entry.path for _, entry in _scan_files(project_path)), None)
+    if not entries or first_file is None or not _can_clone(first_file, snapshot_path):
+        return False
+
+    clone_flag = "-c" if sys.platform == "darwin" else "--reflink=always"
+    result = subprocess.run(
+        ["cp", "-a", clone_flag, *entries, f"{snapshot_path}/"], capture_output=True,
+    )
+    if result.returncode != 0:
+        for path in entries:  # undo a partial copy
+            dest = Path(snapshot_path) / os.path.basename(path)
+            if dest.is_dir() and not dest.is_symlink():
+                shutil.rmtree(dest)
+            else:
+                dest.unlink(missing_ok=True)
+        return False
+
+    stack = [str(snapshot_path)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if any(fnmatch.fnmatchcase(entry.name, p) for p in _RSYNC_EXCLUDES):
+                    shutil.rmtree(entry.path) if is_dir else os.unlink(entry.path)
+                elif is_dir:
+                    stack.append(entry.path)
+    return True
+
+
+def _latest_snapshot(project_path, exclude):
+    """Newest local snapshot of project_path other than exclude, or None."""
+    latest, latest_mtime = None, None
+    try:
+        entries = list(os.scandir(SNAPSHOT_DIR))
+    except OSError:
+        return None
+    for entry in entries:
+        if entry.path == str(exclude):
+            continue
+        meta = Path(entry.path) / ".ftl_meta"
+        try:
+            if meta.read_text().strip() != str(project_path):
+                continue
+            mtime = meta.stat().st_mtime
+        except OSError:
+            continue
+        if latest_mtime is None or mtime > latest_mtime:
+            latest, latest_mtime = entry.path, mtime
+    return latest
+
+
+def _copy_project(project_path, snapshot_path):
+    """Copy the project into snapshot_path minus excluded files: clones if possible, else rsync.
+
+    rsync hardlinks files unchanged since the project's previous snapshot
+    (--link-dest) instead of copying them, so repeated snapshots only cost
+    the bytes that changed. Snapshots are never written after creation, so
+    sharing inodes between them is safe.
+    """
+    ignore_set = get_ignore_set(project_path)
+    if _clone_project(project_path, snapshot_path, ignore_set):
+        return
+
+    # Build exclude args from hardcoded list + .ftlignore patterns
+    excludes = list(_RSYNC_EXCLUDES) + [f"/{p}" for p in ignore_set]
+    exclude_args = []
+    for e in excludes:
+        exclude_args += ["--exclude", e]
+    previous = _latest_snapshot(project_path, snapshot_path)
+    if previous:
+        exclude_args += ["--link-dest", previous]
+
+    subprocess.run(
+        ["rsync", "-a", "--delete"] + exclude_args +
+        [str(project_path) + "/", str(snapshot_path) + "/"],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _rsync_tree(src, dst):
+    """rsync src's files into dst minus snapshot metadata; False if rsync is unavailable or fails."""
+    try:
+        result = subprocess.run(
+            ["rsync", "-a", "--exclude", "/.ftl_meta", "--exclude", f"/{MANIFEST_FILE}",
+             f"{src}/", f"{dst}/"],
+            capture_output=True,
+        )
+    except OSError:
+        return False
+    return result.returncode == 0
+
+
+def _restore_tree(snapshot_path, target):
+    """Copy a snapshot's files into target, leaving out its metadata files.
+
+    Restoring over an existing tree (a rollback) goes through rsync, whose
+    size/mtime check rewrites only the files that differ. Otherwise a single
+    copy-on-write cp is tried first. Failing both, directories are created up
+    front and the files copied on a small thread pool, since each copy is
+    mostly waiting on open/read/write syscalls.
+    """
+    target.mkdir(parents=True, exist_ok=True)
+    if any(target.iterdir()) and _rsync_tree(snapshot_path, target):
+        return
+    if _clone_tree(snapshot_path, target):
+        for name in (".ftl_meta", MANIFEST_FILE):
+            (target / name).unlink(missing_ok=True)
+        return
+
+    made_dirs = set()
+    pairs = []
+    for item in snapshot_path.rglob("*"):
+        if item.name in {".ftl_meta", MANIFEST_FILE}:
+            continue
+        relative = item.relative_to(snapshot_path)
+        dest = target / relative
+        is_dir = item.is_dir()
+        parent = dest if is_dir else dest.parent
+        if parent not in made_dirs:  # one mkdir per directory, not per file
+            parent.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(parent)
+        if not is_dir:
+            pairs.append((item, dest))
+
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as pool:
+        # list() so a failed copy raises here rather than being dropped.
+        list(pool.map(lambda pair: shutil.copy2(*pair), pairs))
+
 
 class LocalSnapshotStore(SnapshotStore):
 
@@ -32,34 +241,17 @@ class LocalSnapshotStore(SnapshotStore):
         snapshot_path = SNAPSHOT_DIR / snapshot_id
         snapshot_path.mkdir(parents=True, exist_ok=True)
 
-        # Build exclude args from hardcoded list + .ftlignore patterns
-        ignore_set = get_ignore_set(project_path)
-        excludes = list(_RSYNC_EXCLUDES) + [f"/{p}" for p in ignore_set]
-        exclude_args = []
-        for e in excludes:
-            exclude_args += ["--exclude", e]
+        _copy_project(project_path, snapshot_path)
+        (snapshot_path / ".ftl_meta").write_text(str(project_path))
 
-        # Warn about large files (> 100MB)
-        large_files = []
-        for f in project_path.rglob("*"):
-            if f.is_file() and not any(p in f.parts for p in ignore_set):
-                size_mb = f.stat().st_size / 1_000_000
-                if size_mb > 100:
-                    large_files.append((f.name, int(size_mb)))
+        # Warn about large files (> 100MB). The manifest pass already stats
+        # every snapshotted file, so this needs no walk of its own.
+        large_files = self._write_manifest(snapshot_path)
         if large_files:
             print(f"Warning: {len(large_files)} large file(s) found (add to .ftlignore to exclude):")
             for name, size in large_files[:3]:
                 print(f"  {name} ({size}MB)")
 
-        subprocess.run(
-            ["rsync", "-a", "--delete"] + exclude_args +
-            [str(project_path) + "/", str(snapshot_path) + "/"],
-            check=True,
-            capture_output=True,
-        )
-        (snapshot_path / ".ftl_meta").write_text(str(project_path))
-        self._write_manifest(snapshot_path)
-
         return snapshot_id
 
     def restore(self, snapshot_id, target_path=None):
@@ -71,17 +263,7 @@ class LocalSnapshotStore(SnapshotStore):
         original_path = Path(meta_file.read_text().strip())
         target = Path(target_path) if target_path else original_path
 
-        for item in snapshot_path.rglob("*"):
-            if item.name in {".ftl_meta", MANIFEST_FILE}:
-                continue
-            relative = item.relative_to(snapshot_path)
-            dest = target / relative
-            if item.is_dir():
-                dest.mkdir(parents=True, exist_ok=True)
-            else:
-                dest.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(item, dest)
-
+        _restore_tree(snapshot_path, target)
         return target
 
     def list(self, project_path=None):
@@ -106,13 +288,16 @@ class LocalSnapshotStore(SnapshotStore):
             shutil.rmtree(snapshot_path)
 
     def _write_manifest(self, snapshot_path):
+        """Write the size/mtime manifest; return (name, size_mb) for files over 100MB."""
         lines = []
-        for item in sorted(snapshot_path.rglob("*")):
-            if not item.is_file():
-                continue
-            if item.name in {".ftl_meta", MANIFEST_FILE}:
+        large_files = []
+        for rel, entry in _scan_files(snapshot_path):
+            if entry.name in {".ftl_meta", MANIFEST_FILE}:
                 continue
-            rel = item.relative_to(snapshot_path)
-            stat = item.stat()
+            stat = entry.stat()
             lines.append(f"{rel}\t{stat.st_size}\t{stat.st_mtime_ns}")
+            if stat.st_size > _LARGE_FILE_BYTES:
+                large_files.append((entry.name, stat.st_size // 1_000_000))
+        lines.sort()
         (snapshot_path / MANIFEST_FILE).write_text("\n".join(lines))
+        return large_files
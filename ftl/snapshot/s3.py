@@ -16,19 +16,21 @@ Requires boto3: pip install -e ".[aws]"
 
 import base64
 import hashlib
-import io
+import os
 import shutil
-import subprocess
 import tarfile
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from ftl.ignore import get_ignore_set
 from ftl.snapshot.base import SnapshotStore
-from ftl.snapshot.local import SNAPSHOT_DIR, _RSYNC_EXCLUDES
+from ftl.snapshot.local import SNAPSHOT_DIR, _copy_project, _restore_tree
 
 S3_PREFIX = "snapshots"
 META_KEY = "ftl-project-path"  # kept for backwards-compat reads; new keys encode path in name
+_KEY_CACHE_TTL = 300  # seconds a cached snapshot_id -> key entry is trusted
 
 
 def _encode_path(project_path):
@@ -42,6 +44,14 @@ def _decode_path(encoded):
     return base64.urlsafe_b64decode(encoded + "=" * padding).decode()
 
 
+def _key_stem(key):
+    """Filename of an S3 key without its .tar.gz extension."""
+    stem = Path(key).stem  # strips .gz
+    if stem.endswith(".tar"):
+        stem = stem[:-4]    # strips .tar from .tar.gz double extension
+    return stem
+
+
 class S3SnapshotStore(SnapshotStore):
     """Snapshot store backed by S3, with a local cache for container mounts."""
 
@@ -55,6 +65,9 @@ class S3SnapshotStore(SnapshotStore):
                 "Install with: pip install -e '.[aws]'"
             )
         self.bucket = bucket
+        # snapshot_id -> (S3 key, time it was seen), from listings and from
+        # keys this store wrote itself.
+        self._key_cache = {}
 
     # ------------------------------------------------------------------
     # Public interface
@@ -66,36 +79,26 @@ class S3SnapshotStore(SnapshotStore):
         local_path = SNAPSHOT_DIR / snapshot_id
         local_path.mkdir(parents=True, exist_ok=True)
 
-        # Write meta before copy so rsync picks it up
+        # Copy to local cache (same as LocalSnapshotStore). Meta is written
+        # after the copy: rsync --delete would remove it, and it has to be in
+        # place before the tarball is built.
+        _copy_project(project_path, local_path)
         (local_path / ".ftl_meta").write_text(str(project_path))
 
-        # rsync to local cache (same as LocalSnapshotStore)
-        ignore_set = get_ignore_set(project_path)
-        excludes = list(_RSYNC_EXCLUDES) + [f"/{p}" for p in ignore_set]
-        exclude_args = []
-        for e in excludes:
-            exclude_args += ["--exclude", e]
-
-        subprocess.run(
-            ["rsync", "-a", "--delete"] + exclude_args +
-            [str(project_path) + "/", str(local_path) + "/"],
-            check=True,
-            capture_output=True,
-        )
-
         # Upload tarball to S3 — project path encoded in key name, no metadata needed
         s3_key = self._key(project_path, snapshot_id)
-        tarball = self._make_tarball(local_path)
         try:
-            self._s3.put_object(Bucket=self.bucket, Key=s3_key, Body=tarball)
+            self._upload_tarball(local_path, s3_key)
         except Exception as e:
+            # Multipart uploads wrap the ClientError, so also check the message.
             error_code = (getattr(e, "response", None) or {}).get("Error", {}).get("Code", "")
-            if error_code == "NoSuchBucket":
+            if error_code == "NoSuchBucket" or "NoSuchBucket" in str(e):
                 raise RuntimeError(
                     f"S3 bucket '{self.bucket}' does not exist. "
                     "Create it first or run 'ftl config --aws'."
                 ) from e
             raise
+        self._key_cache[snapshot_id] = (s3_key, time.monotonic())
 
         return snapshot_id
 
@@ -109,8 +112,11 @@ class S3SnapshotStore(SnapshotStore):
             if s3_key is None:
                 raise ValueError(f"Snapshot {snapshot_id} not found in S3 or local cache")
             response = self._s3.get_object(Bucket=self.bucket, Key=s3_key)
-            tarball_bytes = response["Body"].read()
-            self._extract_tarball(tarball_bytes, local_path)
+            try:
+                self._extract_tarball(response["Body"], local_path)
+            except Exception:
+                shutil.rmtree(local_path, ignore_errors=True)  # don't leave a partial cache
+                raise
 
         meta_file = local_path / ".ftl_meta"
         if not meta_file.exists():
@@ -118,40 +124,60 @@ class S3SnapshotStore(SnapshotStore):
         original_path = Path(meta_file.read_text().strip())
         target = Path(target_path) if target_path else original_path
 
-        for item in local_path.rglob("*"):
-            if item.name == ".ftl_meta":
-                continue
-            relative = item.relative_to(local_path)
-            dest = target / relative
-            if item.is_dir():
-                dest.mkdir(parents=True, exist_ok=True)
-            else:
-                dest.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(item, dest)
-
+        _restore_tree(local_path, target)
         return target
 
     def list(self, project_path=None):
-        prefix = f"{S3_PREFIX}/"
-        paginator = self._s3.get_paginator("list_objects_v2")
-        snapshots = []
+        parsed = []
+        legacy = []
+        for key in self._list_keys():
+            if "__" in _key_stem(key):
+                parsed.append(self._parse_key(key))
+            else:
+                legacy.append(key)
+        if legacy:
+            # Old keys need a HEAD each for the project path; overlap them.
+            with ThreadPoolExecutor(max_workers=10) as pool:
+                parsed.extend(pool.map(lambda k: self._parse_key(k, legacy=True), legacy))
 
-        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
-            for obj in page.get("Contents", []):
-                key = obj["Key"]
-                snapshot_id, proj = self._parse_key(key)
-                if snapshot_id is None:
-                    continue
-                if project_path and str(Path(project_path).resolve()) != proj:
-                    continue
-                snapshots.append({"id": snapshot_id, "project": proj})
+        snapshots = []
+        for snapshot_id, proj in parsed:
+            if snapshot_id is None:
+                continue
+            if project_path and str(Path(project_path).resolve()) != proj:
+                continue
+            snapshots.append({"id": snapshot_id, "project": proj})
 
         return snapshots
 
+    def migrate_legacy_keys(self):
+        """Rename old-format keys to the path-encoded layout. Returns how many moved.
+
+        Once migrated, list() no longer needs a HEAD request per old snapshot.
+        """
+        legacy = [key for key in self._list_keys() if "__" not in _key_stem(key)]
+
+        def migrate(key):
+            snapshot_id, proj = self._parse_key(key, legacy=True)
+            if snapshot_id is None:
+                return False
+            new_key = self._key(proj, snapshot_id)
+            self._s3.copy_object(
+                Bucket=self.bucket, Key=new_key,
+                CopySource={"Bucket": self.bucket, "Key": key},
+            )
+            self._s3.delete_object(Bucket=self.bucket, Key=key)
+            self._key_cache[snapshot_id] = (new_key, time.monotonic())
+            return True
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            return sum(pool.map(migrate, legacy))
+
     def delete(self, snapshot_id):
         s3_key = self._find_key(snapshot_id)
         if s3_key:
             self._s3.delete_object(Bucket=self.bucket, Key=s3_key)
+            self._key_cache.pop(snapshot_id, None)
 
         local_path = SNAPSHOT_DIR / snapshot_id
         if local_path.exists():
@@ -163,15 +189,26 @@ class S3SnapshotStore(SnapshotStore):
 
     def _key(self, project_path, snapshot_id):
         """S3 key for a snapshot. Encodes project path in the filename — no metadata needed."""
-        project_hash = hashlib.md5(str(project_path).encode()).hexdigest()[:12]
+        # Older snapshots sit under an md5-derived directory; lookups parse the
+        # filename only, so both layouts stay readable.
+        project_hash = hashlib.blake2b(str(project_path).encode(), digest_size=6).hexdigest()
         path_b64 = _encode_path(project_path)
         return f"{S3_PREFIX}/{project_hash}/{snapshot_id}__{path_b64}.tar.gz"
 
-    def _parse_key(self, key):
-        """Extract (snapshot_id, project_path) from an S3 key. Returns (None, None) on failure."""
-        stem = Path(key).stem  # strips .gz
-        if stem.endswith(".tar"):
-            stem = stem[:-4]    # strips .tar from .tar.gz double extension
+    def _list_keys(self):
+        """Yield every object key under the snapshots prefix."""
+        paginator = self._s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{S3_PREFIX}/"):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
+
+    def _parse_key(self, key, legacy=False):
+        """Extract (snapshot_id, project_path) from an S3 key. Returns (None, None) on failure.
+
+        Old keys without an encoded path cost a HEAD request, so they're only
+        resolved when legacy=True.
+        """
+        stem = _key_stem(key)
         if "__" in stem:
             snapshot_id, path_b64 = stem.split("__", 1)
             try:
@@ -179,6 +216,8 @@ class S3SnapshotStore(SnapshotStore):
             except Exception:
                 return None, None
             return snapshot_id, proj
+        if not legacy:
+            return None, None
         # Backwards compat: old keys without encoded path — fall back to head_object
         try:
             head = self._s3.head_object(Bucket=self.bucket, Key=key)
@@ -189,33 +228,63 @@ class S3SnapshotStore(SnapshotStore):
             return None, None
 
     def _find_key(self, snapshot_id):
-        """Search for the S3 key matching exactly this snapshot ID."""
-        prefix = f"{S3_PREFIX}/"
-        paginator = self._s3.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
-            for obj in page.get("Contents", []):
-                key_id, _ = self._parse_key(obj["Key"])
-                if key_id == snapshot_id:
-                    return obj["Key"]
-        return None
-
-    def _make_tarball(self, directory):
-        """Create a gzipped tarball of directory in memory. Returns bytes."""
-        buf = io.BytesIO()
-        with tarfile.open(fileobj=buf, mode="w:gz") as tar:
-            tar.add(directory, arcname=".")
-        return buf.getvalue()
-
-    def _extract_tarball(self, data, target):
-        """Extract a gzipped tarball bytes into target directory.
-
-        Validates every member path to prevent path traversal attacks (e.g. ../../../etc/passwd).
+        """Search for the S3 key matching exactly this snapshot ID.
+
+        One listing maps every snapshot ID to its key. Each entry, listed or
+        written by this store, is trusted for _KEY_CACHE_TTL after it was
+        seen; a miss or a stale entry re-lists in case another process has
+        created or moved the snapshot since.
+        """
+        cached = self._key_cache.get(snapshot_id)
+        if cached is not None and time.monotonic() - cached[1] < _KEY_CACHE_TTL:
+            return cached[0]
+        now = time.monotonic()
+        keys = {}
+        for s3_key in self._list_keys():
+            # The ID is the part of the stem before "__", or all of it for old
+            # keys — no need for their HEAD-resolved project path here.
+            keys[_key_stem(s3_key).split("__", 1)[0]] = (s3_key, now)
+        self._key_cache = keys
+        found = keys.get(snapshot_id)
+        return found[0] if found else None
+
+    def _upload_tarball(self, directory, s3_key):
+        """Stream a gzipped tarball of directory to S3 without building it in memory.
+
+        A thread writes the tar into a pipe while upload_fileobj reads the
+        other end, so compression overlaps the (multipart) upload.
+        """
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def produce():
+            try:
+                with os.fdopen(write_fd, "wb") as out, \
+                        tarfile.open(fileobj=out, mode="w|gz") as tar:
+                    tar.add(directory, arcname=".")
+            except Exception as e:  # includes BrokenPipeError if the upload gave up
+                errors.append(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            with os.fdopen(read_fd, "rb") as reader:
+                self._s3.upload_fileobj(reader, self.bucket, s3_key)
+        finally:
+            producer.join()
+        if errors:
+            raise errors[0]
+
+    def _extract_tarball(self, stream, target):
+        """Extract a gzipped tarball read from stream into target directory.
+
+        Members are checked as they arrive to prevent path traversal attacks
+        (e.g. ../../../etc/passwd); the caller discards target on failure.
         """
         target = Path(target).resolve()
-        buf = io.BytesIO(data)
-        with tarfile.open(fileobj=buf, mode="r:gz") as tar:
-            for member in tar.getmembers():
+        with tarfile.open(fileobj=stream, mode="r|gz") as tar:
+            for member in tar:
                 member_path = (target / member.name).resolve()
                 if not str(member_path).startswith(str(target) + "/") and member_path != target:
                     raise ValueError(f"Unsafe path in tarball: {member.name!r}")
-            tar.extractall(target)
+                tar.extract(member, target)
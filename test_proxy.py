@@ -4,19 +4,23 @@ Tests:
   1. HTTP  — shadow value in Authorization header is swapped to real value
   2. HTTP  — shadow value in JSON request body is swapped
   3. HTTPS — shadow value in Authorization header swapped through MITM tunnel
+  4. HTTP  — an idle CONNECT tunnel does not block other requests
+  5. stop() returns while every connection slot is taken
 
 Run: python3 test_proxy.py
 """
 
+import http.client
 import http.server
 import json
+import socket
 import ssl
 import threading
 import time
-import urllib.request
-import urllib.error
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 import pytest
 
 sys.path.insert(0, os.path.dirname(__file__))
@@ -27,99 +31,179 @@ REAL   = "sk_live_abc123_real_key"
 SWAP   = {SHADOW: REAL}
 
 # ── Capture what the upstream server actually received ────────────────────────
+# Tests may run concurrently, so each posts to its own path and waits on the
+# condition for a matching request instead of reading the last entry.
 received_requests = []
+_received = threading.Condition()
 
 
 class _CapturingHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 so a client's connection (and the proxy's MITM tunnel behind
+    # it) can stay open across requests.
+    protocol_version = "HTTP/1.1"
+
     def log_message(self, *a): pass
 
     def do_POST(self):
         length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(length)
-        received_requests.append({
-            "auth":   self.headers.get("Authorization", ""),
-            "body":   body.decode(),
-            "path":   self.path,
-        })
+        with _received:
+            received_requests.append({
+                "auth":   self.headers.get("Authorization", ""),
+                "body":   body.decode(),
+                "path":   self.path,
+            })
+            _received.notify_all()
+        reply = b'{"ok": true}'
         self.send_response(200)
+        self.send_header("Content-Length", str(len(reply)))
         self.end_headers()
-        self.wfile.write(b'{"ok": true}')
+        self.wfile.write(reply)
+
+
+def _wait_listening(port, deadline=1.0):
+    """Poll until port accepts connections, backing off 1 ms between tries."""
+    end = time.monotonic() + deadline
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.01).close()
+            return
+        except OSError:
+            if time.monotonic() >= end:
+                raise
+            time.sleep(0.001)
 
 
 def start_http_server(port):
-    srv = http.server.HTTPServer(("127.0.0.1", port), _CapturingHandler)
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", port), _CapturingHandler)
     t = threading.Thread(target=srv.serve_forever, daemon=True)
     t.start()
+    _wait_listening(port)
     return srv
 
 
 def start_https_server(port, certfile, keyfile):
-    srv = http.server.HTTPServer(("127.0.0.1", port), _CapturingHandler)
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", port), _CapturingHandler)
     ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     ctx.load_cert_chain(certfile, keyfile)
     srv.socket = ctx.wrap_socket(srv.socket, server_side=True)
     t = threading.Thread(target=srv.serve_forever, daemon=True)
     t.start()
+    _wait_listening(port)
     return srv
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
+def wait_for_request(path, timeout=2):
+    """Block until the upstream has recorded a request for path and return it."""
+    def hit():
+        return next((r for r in reversed(received_requests) if r["path"] == path), None)
+
+    with _received:
+        found = _received.wait_for(hit, timeout)
+    assert found, f"Upstream never received a request for {path}"
+    return found
+
+
 def find_free_port():
-    import socket
     with socket.socket() as s:
         s.bind(("127.0.0.1", 0))
         return s.getsockname()[1]
 
 
-def make_proxy_opener(proxy_port):
-    """Return a urllib opener that routes through the proxy."""
-    proxy = urllib.request.ProxyHandler({
-        "http":  f"http://127.0.0.1:{proxy_port}",
-        "https": f"http://127.0.0.1:{proxy_port}",
-    })
-    # Accept any TLS cert (proxy presents its own)
-    ctx = ssl.create_default_context()
-    ctx.check_hostname = False
-    ctx.verify_mode = ssl.CERT_NONE
-    https_handler = urllib.request.HTTPSHandler(context=ctx)
-    return urllib.request.build_opener(proxy, https_handler)
-
-
-def gen_self_signed_cert():
-    """Generate a self-signed cert for the local HTTPS test server."""
-    from cryptography import x509
-    from cryptography.hazmat.primitives import hashes, serialization
-    from cryptography.hazmat.primitives.asymmetric import rsa
-    from cryptography.x509.oid import NameOID
-    from datetime import datetime, timedelta, timezone
-    import tempfile
-
-    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
-    now = datetime.now(timezone.utc)
-    cert = (
-        x509.CertificateBuilder()
-        .subject_name(name).issuer_name(name)
-        .public_key(key.public_key())
-        .serial_number(x509.random_serial_number())
-        .not_valid_before(now).not_valid_after(now + timedelta(hours=1))
-        .add_extension(
-            x509.SubjectAlternativeName([x509.IPAddress(__import__("ipaddress").ip_address("127.0.0.1"))]),
-            critical=False,
-        )
-        .sign(key, hashes.SHA256())
-    )
-    key_pem  = key.private_bytes(serialization.Encoding.PEM,
-                                  serialization.PrivateFormat.TraditionalOpenSSL,
-                                  serialization.NoEncryption())
-    cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+# Accept any TLS cert (proxy presents its own). Built once: creating a default
+# context loads the system CA bundle.
+_INSECURE_CTX = ssl.create_default_context()
+_INSECURE_CTX.check_hostname = False
+_INSECURE_CTX.verify_mode = ssl.CERT_NONE
+
+_conns = threading.local()
+
+
+def _get_conn(host, port, proxy_port, tls=False, timeout=10):
+    """Return this thread's connection to host:port through the proxy.
+
+    Memoized on the target, so repeated requests to one origin reuse the
+    keep-alive connection (for HTTPS, the established CONNECT tunnel);
+    http.client reopens it transparently if the far end closed it.
+    """
+    cache = _conns.__dict__.setdefault("by_target", {})
+    key = (host, port, proxy_port, tls)
+    conn = cache.get(key)
+    if conn is None:
+        if tls:
+            conn = http.client.HTTPSConnection("127.0.0.1", proxy_port, timeout=timeout,
+                                               context=_INSECURE_CTX)
+            conn.set_tunnel(host, port)
+        else:
+            conn = http.client.HTTPConnection("127.0.0.1", proxy_port, timeout=timeout)
+        cache[key] = conn
+    return conn
+
+
+def post_via_proxy(proxy_port, url, body, headers, timeout=10):
+    """POST body to url through the proxy and return the response status."""
+    scheme, _, rest = url.partition("://")
+    netloc, _, path = rest.partition("/")
+    host, _, port = netloc.rpartition(":")
+    tls = scheme == "https"
+    conn = _get_conn(host, int(port), proxy_port, tls, timeout)
+    # Plain HTTP goes to the proxy in absolute form; HTTPS rides the tunnel.
+    conn.request("POST", "/" + path if tls else url, body=body, headers=headers)
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+
+# The proxy's CA cert needs to be trusted by the test client; _INSECURE_CTX
+# skips verification (simulating a container with the CA installed). The proxy
+# itself verifies the upstream server cert, but the test server is self-signed,
+# so tests that tunnel to it patch do_CONNECT to skip upstream verification.
+_UPSTREAM_CTX = ssl.create_default_context()
+_UPSTREAM_CTX.check_hostname = False
+_UPSTREAM_CTX.verify_mode = ssl.CERT_NONE
+
+
+def _insecure_connect(self):
+    """_ProxyHandler.do_CONNECT, minus upstream cert verification."""
+    host, _, port_str = self.path.rpartition(":")
+    port = int(port_str) if port_str.isdigit() else 443
+
+    self.send_response(200, "Connection Established")
+    self.end_headers()
+
+    ssl_ctx = self._get_ssl_context(host)
+    try:
+        client_ssl = ssl_ctx.wrap_socket(self.connection, server_side=True)
+    except ssl.SSLError:
+        return
+
+    try:
+        upstream_sock = socket.create_connection((host, port), timeout=5)
+        upstream_ssl = _UPSTREAM_CTX.wrap_socket(upstream_sock, server_hostname=host)
+    except Exception:
+        client_ssl.close()
+        return
+
+    self._relay(client_ssl, upstream_ssl)
 
-    kf = tempfile.NamedTemporaryFile(delete=False, suffix="-key.pem")
-    kf.write(key_pem); kf.close()
-    cf = tempfile.NamedTemporaryFile(delete=False, suffix="-cert.pem")
-    cf.write(cert_pem); cf.close()
-    return kf.name, cf.name, cert_pem
+
+def insecure_upstream_patch():
+    """Patch the proxy to accept the self-signed upstream test server."""
+    from ftl.proxy import _ProxyHandler
+    return mock.patch.object(_ProxyHandler, "do_CONNECT", _insecure_connect)
+
+
+# Checked-in key+cert for the local HTTPS test server, as one combined PEM
+# (load_cert_chain accepts that). Its contents don't matter to the tests: the
+# proxy terminates TLS with its own cert.
+_CERT_FIXTURE = os.path.join(os.path.dirname(__file__), "tests", "fixtures", "localhost.pem")
+
+
+def self_signed_cert():
+    """Return the path of the combined key+cert PEM for the local HTTPS test server."""
+    return _CERT_FIXTURE
 
 
 @pytest.fixture(autouse=True)
@@ -138,7 +222,7 @@ def proxy():
     except PermissionError:
         pytest.skip("Socket binding is unavailable in this execution environment.")
     test_proxy.start()
-    time.sleep(0.1)
+    _wait_listening(test_proxy.port)
     try:
         yield test_proxy
     finally:
@@ -150,123 +234,139 @@ def proxy_port(proxy):
     return proxy.port
 
 
+@pytest.fixture(scope="module")
+def http_port():
+    port = find_free_port()
+    start_http_server(port)
+    return port
+
+
+@pytest.fixture
+def insecure_upstream():
+    with insecure_upstream_patch():
+        yield
+
+
+@pytest.fixture(scope="module")
+def https_port():
+    port = find_free_port()
+    start_https_server(port, self_signed_cert(), self_signed_cert())
+    return port
+
+
 # ── Tests ─────────────────────────────────────────────────────────────────────
 
-def test_http_header_swap(proxy_port):
+def test_swap_replaces_every_occurrence(proxy):
+    """Shadow values anywhere in a chunk are swapped in a single pass."""
+    from ftl.proxy import _ProxyHandler
+
+    handler = _ProxyHandler.__new__(_ProxyHandler)
+    handler.server = proxy._server
+    data = f"key={SHADOW}&again={SHADOW}".encode()
+
+    assert handler._swap(data) == f"key={REAL}&again={REAL}".encode()
+    assert handler._swap(b"nothing to see") == b"nothing to see"
+    assert handler._swap_str(f"Bearer {SHADOW}") == f"Bearer {REAL}"
+    print("  [PASS] single-pass swap")
+
+
+def test_http_header_swap(proxy_port, http_port):
     """Shadow value in Authorization header → swapped to real value."""
-    target_port = find_free_port()
-    start_http_server(target_port)
-    time.sleep(0.05)
-
-    opener = make_proxy_opener(proxy_port)
-    req = urllib.request.Request(
-        f"http://127.0.0.1:{target_port}/api/charge",
-        data=b"{}",
-        headers={
+    status = post_via_proxy(
+        proxy_port,
+        f"http://127.0.0.1:{http_port}/api/charge/http-header",
+        b"{}",
+        {
             "Authorization": f"Bearer {SHADOW}",
             "Content-Type": "application/json",
         },
-        method="POST",
     )
-    opener.open(req)
-    time.sleep(0.05)
+    assert status == 200, f"Upstream returned {status}"
 
-    hit = received_requests[-1]
-    assert REAL   in hit["auth"], f"Expected real key in Authorization, got: {hit['auth']}"
-    assert SHADOW not in hit["auth"], "Shadow key leaked into Authorization header!"
+    hit = wait_for_request("/api/charge/http-header")
+    auth = hit["auth"]
+    assert REAL   in auth, f"Expected real key in Authorization, got: {auth}"
+    assert SHADOW not in auth, "Shadow key leaked into Authorization header!"
     print("  [PASS] HTTP header swap")
 
 
-def test_http_body_swap(proxy_port):
+def test_http_body_swap(proxy_port, http_port):
     """Shadow value in JSON body → swapped to real value."""
-    target_port = find_free_port()
-    start_http_server(target_port)
-    time.sleep(0.05)
-
     payload = json.dumps({"api_key": SHADOW, "amount": 100}).encode()
-    opener = make_proxy_opener(proxy_port)
-    req = urllib.request.Request(
-        f"http://127.0.0.1:{target_port}/api/charge",
-        data=payload,
-        headers={"Content-Type": "application/json"},
-        method="POST",
+    status = post_via_proxy(
+        proxy_port,
+        f"http://127.0.0.1:{http_port}/api/charge/http-body",
+        payload,
+        {"Content-Type": "application/json"},
     )
-    opener.open(req)
-    time.sleep(0.05)
+    assert status == 200, f"Upstream returned {status}"
 
-    hit = received_requests[-1]
-    body = json.loads(hit["body"])
-    assert body["api_key"] == REAL,   f"Expected real key in body, got: {body['api_key']}"
-    assert SHADOW not in hit["body"], "Shadow key leaked into request body!"
+    hit = wait_for_request("/api/charge/http-body")
+    raw = hit["body"]
+    api_key = json.loads(raw)["api_key"]
+    assert api_key == REAL,   f"Expected real key in body, got: {api_key}"
+    assert SHADOW not in raw, "Shadow key leaked into request body!"
     print("  [PASS] HTTP body swap")
 
 
-def test_https_header_swap(proxy_port, proxy):
-    """Shadow value in Authorization header → swapped through HTTPS MITM tunnel."""
-    key_path, cert_path, server_cert_pem = gen_self_signed_cert()
-    target_port = find_free_port()
-    start_https_server(target_port, cert_path, key_path)
-    time.sleep(0.1)
-
-    # The proxy's CA cert needs to be trusted by our test opener.
-    # We'll use a context that skips verification (simulating a container with
-    # the CA installed). The proxy itself verifies the upstream server cert —
-    # but our test server is self-signed, so we need to tell the proxy to allow it.
-    # For the test, patch the proxy's upstream context to skip verification.
-    from ftl.proxy import _ProxyHandler
-    original_connect = _ProxyHandler.do_CONNECT
-
-    def patched_connect(self):
-        host, _, port_str = self.path.rpartition(":")
-        port = int(port_str) if port_str.isdigit() else 443
-
-        self.send_response(200, "Connection Established")
-        self.end_headers()
+def test_idle_tunnel_does_not_block_other_requests(proxy_port, http_port):
+    """A CONNECT tunnel waiting on its client must not stall plain HTTP traffic."""
+    tunnel = socket.create_connection(("127.0.0.1", proxy_port))
+    try:
+        tunnel.sendall(b"CONNECT example.com:443 HTTP/1.1\r\nHost: example.com:443\r\n\r\n")
+        assert tunnel.recv(1024).startswith(b"HTTP/1.0 200")
+
+        status = post_via_proxy(
+            proxy_port,
+            f"http://127.0.0.1:{http_port}/api/charge",
+            b"{}",
+            {"Authorization": f"Bearer {SHADOW}"},
+            timeout=5,
+        )
+        assert status == 200
+    finally:
+        tunnel.close()
+    print("  [PASS] idle tunnel does not block requests")
 
-        ssl_ctx = self._get_ssl_context(host)
-        try:
-            client_ssl = ssl_ctx.wrap_socket(self.connection, server_side=True)
-        except ssl.SSLError:
-            return
 
-        # Connect to test server — skip verification (self-signed cert)
-        import socket as _socket
-        try:
-            upstream_sock = _socket.create_connection((host, port), timeout=5)
-            upstream_ctx = ssl.create_default_context()
-            upstream_ctx.check_hostname = False
-            upstream_ctx.verify_mode = ssl.CERT_NONE
-            upstream_ssl = upstream_ctx.wrap_socket(upstream_sock, server_hostname=host)
-        except Exception:
-            client_ssl.close()
-            return
+def test_stop_returns_with_every_slot_taken(proxy):
+    """stop() must not hang while the accept loop waits for a free connection slot."""
+    proxy._server.connection_slots = threading.BoundedSemaphore(1)
+    tunnel = socket.create_connection(("127.0.0.1", proxy.port))
+    waiting = socket.create_connection(("127.0.0.1", proxy.port))
+    try:
+        tunnel.sendall(b"CONNECT example.com:443 HTTP/1.1\r\nHost: example.com:443\r\n\r\n")
+        assert tunnel.recv(1024).startswith(b"HTTP/1.0 200")
 
-        self._relay(client_ssl, upstream_ssl)
+        stopper = threading.Thread(target=proxy.stop, daemon=True)
+        stopper.start()
+        stopper.join(timeout=5)
+        assert not stopper.is_alive(), "stop() hung behind a full connection pool"
+    finally:
+        tunnel.close()
+        waiting.close()
+    print("  [PASS] stop with every slot taken")
 
-    _ProxyHandler.do_CONNECT = patched_connect
 
-    try:
-        opener = make_proxy_opener(proxy_port)
-        req = urllib.request.Request(
-            f"https://127.0.0.1:{target_port}/api/charge",
-            data=b"{}",
-            headers={
-                "Authorization": f"Bearer {SHADOW}",
-                "Content-Type": "application/json",
-            },
-            method="POST",
-        )
-        opener.open(req, timeout=10)
-        time.sleep(0.1)
+@pytest.mark.usefixtures("insecure_upstream")
+def test_https_header_swap(proxy_port, proxy, https_port):
+    """Shadow value in Authorization header → swapped through HTTPS MITM tunnel."""
+    status = post_via_proxy(
+        proxy_port,
+        f"https://127.0.0.1:{https_port}/api/charge/https-header",
+        b"{}",
+        {
+            "Authorization": f"Bearer {SHADOW}",
+            "Content-Type": "application/json",
+        },
+    )
+    assert status == 200, f"Upstream returned {status}"
 
-        hit = received_requests[-1]
-        assert REAL   in hit["auth"], f"Expected real key in Authorization, got: {hit['auth']}"
-        assert SHADOW not in hit["auth"], "Shadow key leaked through HTTPS tunnel!"
-        print("  [PASS] HTTPS header swap (MITM)")
-    finally:
-        _ProxyHandler.do_CONNECT = original_connect
-        os.unlink(key_path)
-        os.unlink(cert_path)
+    hit = wait_for_request("/api/charge/https-header")
+    auth = hit["auth"]
+    assert REAL   in auth, f"Expected real key in Authorization, got: {auth}"
+    assert SHADOW not in auth, "Shadow key leaked through HTTPS tunnel!"
+    print("  [PASS] HTTPS header swap (MITM)")
 
 
 # ── Main ──────────────────────────────────────────────────────────────────────
@@ -278,13 +378,26 @@ def main():
     proxy = CredentialSwapProxy(SWAP)
     proxy.start()
     print(f"  Proxy on port {proxy.port}")
-    time.sleep(0.1)
+    _wait_listening(proxy.port)
+
+    http_port = find_free_port()
+    start_http_server(http_port)
+    https_port = find_free_port()
+    start_https_server(https_port, self_signed_cert(), self_signed_cert())
 
     print("\nRunning tests:")
     try:
-        test_http_header_swap(proxy.port)
-        test_http_body_swap(proxy.port)
-        test_https_header_swap(proxy.port, proxy)
+        test_swap_replaces_every_occurrence(proxy)
+        test_idle_tunnel_does_not_block_other_requests(proxy.port, http_port)
+        with insecure_upstream_patch(), ThreadPoolExecutor(max_workers=3) as ex:
+            futures = [
+                ex.submit(test_http_header_swap, proxy.port, http_port),
+                ex.submit(test_http_body_swap, proxy.port, http_port),
+                ex.submit(test_https_header_swap, proxy.port, proxy, https_port),
+            ]
+            for f in futures:
+                f.result()
+        test_stop_returns_with_every_slot_taken(proxy)
         print("\nAll tests passed.")
     except AssertionError as e:
         print(f"\n[FAIL] {e}")
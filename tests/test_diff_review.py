@@ -188,3 +188,9 @@ def test_compute_diff_from_overlay_uses_exists_in_snapshot_hint(tmp_path):
 def test_review_system_requires_terse_high_signal_output():
     assert "high-signal language" in diff_mod._REVIEW_SYSTEM
     assert "No filler" in diff_mod._REVIEW_SYSTEM
+
+
+def test_load_json_object_recovers_from_surrounding_prose():
+    text = 'Here is the review:\n{"summary": "adds {braces}", "security_findings": []}\nHope this helps.'
+
+    assert diff_mod._load_json_object(text) == {"summary": "adds {braces}", "security_findings": []}
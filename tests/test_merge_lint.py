@@ -2,7 +2,8 @@ import io
 
 from rich.console import Console
 
-from ftl.orchestrator import Session
+from ftl import orchestrator
+from ftl.orchestrator import Session, _merge_changes
 
 
 def test_merge_blocks_unapproved_destructive_operations(monkeypatch):
@@ -125,3 +126,89 @@ def test_merge_marks_failed_tests_as_review_warning(monkeypatch):
     output = stream.getvalue()
     assert "Review warning: verification failed" in output
     assert "Decide: review required" in output
+
+
+def test_merge_changes_applies_created_modified_and_deleted(tmp_path):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "app.py").write_text("old\n")
+    (project / "stale.py").write_text("bye\n")
+
+    _merge_changes(
+        [
+            {"path": "app.py", "status": "modified", "_content_bytes": b"new\n"},
+            {"path": "pkg/sub/mod.py", "status": "created", "_content_bytes": b"x = 1\n"},
+            {"path": "pkg/sub/other.py", "status": "created", "_content_bytes": b"y = 2\n"},
+            {"path": "stale.py", "status": "deleted"},
+            {"path": "missing.py", "status": "deleted"},
+        ],
+        "/workspace",
+        project,
+    )
+
+    assert (project / "app.py").read_bytes() == b"new\n"
+    assert (project / "pkg" / "sub" / "mod.py").read_bytes() == b"x = 1\n"
+    assert (project / "pkg" / "sub" / "other.py").read_bytes() == b"y = 2\n"
+    assert not (project / "stale.py").exists()
+
+
+def test_merge_changes_moves_files_from_local_workspace(tmp_path):
+    project = tmp_path / "project"
+    workspace = tmp_path / "workspace"
+    (workspace / "pkg").mkdir(parents=True)
+    project.mkdir()
+    (project / "app.py").write_text("old\n")
+    (workspace / "app.py").write_text("new\n")
+    (workspace / "pkg" / "mod.py").write_text("x = 1\n")
+
+    _merge_changes(
+        [
+            {"path": "app.py", "status": "modified"},
+            {"path": "pkg/mod.py", "status": "created"},
+        ],
+        workspace,
+        project,
+    )
+
+    assert (project / "app.py").read_text() == "new\n"
+    assert (project / "pkg" / "mod.py").read_text() == "x = 1\n"
+
+
+def test_merge_changes_skips_modified_files_already_up_to_date(tmp_path):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "same.py").write_text("same\n")
+    (project / "app.py").write_text("old\n")
+    before = (project / "same.py").stat().st_mtime_ns
+
+    skipped = _merge_changes(
+        [
+            {"path": "same.py", "status": "modified", "_content_bytes": b"same\n"},
+            {"path": "app.py", "status": "modified", "_content_bytes": b"new\n"},
+        ],
+        "/workspace",
+        project,
+    )
+
+    assert skipped == 1
+    assert (project / "same.py").stat().st_mtime_ns == before
+    assert (project / "app.py").read_bytes() == b"new\n"
+
+
+def test_fast_copy_falls_back_to_userspace_copy(tmp_path, monkeypatch):
+    def unsupported(in_fd, out_fd, count):
+        raise OSError(38, "Function not implemented")
+
+    def wrong_signature(in_fd, out_fd, count):
+        raise TypeError("offset must be an integer")
+
+    monkeypatch.setattr(orchestrator, "_KERNEL_COPIES", [unsupported, wrong_signature])
+    src = tmp_path / "src.py"
+    dst = tmp_path / "dst.py"
+    src.write_bytes(b"x" * (orchestrator._COPY_BUFSIZE + 7))
+    src.chmod(0o755)
+
+    orchestrator._fast_copy(src, dst)
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mode & 0o777 == 0o755
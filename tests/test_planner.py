@@ -3,12 +3,16 @@ from types import SimpleNamespace
 from ftl import planner
 
 
+def _stream(*deltas):
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=d))]) for d in deltas]
+
+
 def test_generate_tests_prompt_requests_broader_coverage(monkeypatch):
     captured = {}
 
-    def fake_completion(model, messages):
+    def fake_completion(model, messages, stream=False):
         captured["messages"] = messages
-        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="print('ok')"))])
+        return _stream("print('ok')")
 
     monkeypatch.setattr(planner.litellm, "completion", fake_completion)
 
@@ -25,9 +29,9 @@ def test_generate_tests_prompt_requests_broader_coverage(monkeypatch):
 def test_generate_tests_prompt_includes_language_specific_runtime(monkeypatch):
     captured = {}
 
-    def fake_completion(model, messages):
+    def fake_completion(model, messages, stream=False):
         captured["messages"] = messages
-        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="package main"))])
+        return _stream("package main")
 
     monkeypatch.setattr(planner.litellm, "completion", fake_completion)
 
@@ -43,9 +47,9 @@ def test_generate_tests_prompt_includes_language_specific_runtime(monkeypatch):
 def test_run_verification_prompt_requests_failure_recovery(monkeypatch):
     captured = {}
 
-    def fake_completion(model, messages):
+    def fake_completion(model, messages, stream=False):
         captured["messages"] = messages
-        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="print('ok')"))])
+        return _stream("print('ok')")
 
     monkeypatch.setattr(planner.litellm, "completion", fake_completion)
     monkeypatch.setattr(
@@ -70,6 +74,10 @@ def test_run_test_code_uses_cpp_runtime(monkeypatch):
     calls = []
 
     class FakeSandbox:
+        def write_file(self, path, data):
+            calls.append(f"write {path}")
+            return 0, "", ""
+
         def exec(self, command):
             calls.append(command)
             return 0, "ok", ""
@@ -85,6 +93,10 @@ def test_run_test_code_uses_single_file_java_runtime_for_maven_projects(tmp_path
     (tmp_path / "pom.xml").write_text("<project />\n")
 
     class FakeSandbox:
+        def write_file(self, path, data):
+            calls.append(f"write {path}")
+            return 0, "", ""
+
         def exec(self, command):
             calls.append(command)
             return 0, "ok", ""
@@ -99,3 +111,61 @@ def test_run_test_code_uses_single_file_java_runtime_for_maven_projects(tmp_path
 
     assert "/workspace/FtlGeneratedTest.java" in calls[0]
     assert "java ./FtlGeneratedTest.java" in calls[1]
+
+
+def test_run_test_code_installs_missing_modules_and_reruns_in_one_exec():
+    calls = []
+    results = [
+        (1, "ModuleNotFoundError: No module named 'requests.adapters'", ""),
+        (0, "1 passed", ""),
+    ]
+
+    class FakeSandbox:
+        def write_file(self, path, data):
+            calls.append(f"write {path}")
+            return 0, "", ""
+
+        def exec(self, command):
+            calls.append(command)
+            return results.pop(0)
+
+    exit_code, output = planner.run_test_code(
+        "def test_x(): pass",
+        FakeSandbox(),
+        console=SimpleNamespace(print=lambda *args, **kwargs: None),
+    )
+
+    assert exit_code == 0
+    assert output == "1 passed"
+    assert len(calls) == 3
+    assert "[ $ec -ne 0 ] || rm -f /workspace/_ftl_test.py" in calls[1]
+    assert calls[2].startswith("pip install requests -q")
+    assert "rm -f /workspace/_ftl_test.py" in calls[2]
+
+
+def test_generate_tests_stops_reading_after_first_code_block(monkeypatch):
+    consumed, closed = [], []
+
+    def fake_completion(model, messages, stream=False):
+        try:
+            for chunk in _stream("Here:\n```py", "thon\nassert 1\n`", "``\n\nThese tests", " cover..."):
+                consumed.append(chunk)
+                yield chunk
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(planner.litellm, "completion", fake_completion)
+
+    assert planner.generate_tests_from_task("task", "test-model") == "assert 1\n"
+    assert len(consumed) == 3
+    assert closed == [True]
+
+
+def test_generate_tests_keeps_fenced_examples_inside_the_code(monkeypatch):
+    code = 'def f():\n    """\n    ```\n    f()\n    ```\n    """\n'
+    monkeypatch.setattr(
+        planner.litellm, "completion",
+        lambda model, messages, stream=False: _stream("```python\n", code, "```"),
+    )
+
+    assert planner.generate_tests_from_task("task", "test-model") == code
@@ -69,3 +69,20 @@ def test_renderer_flushes_text_before_tool_status():
     assert console.file.getvalue().startswith("hello from agent ")
     assert console.lines
     assert "Read: app.py" in console.lines[0]
+
+
+def test_renderer_shares_one_ticker_thread_across_tools():
+    console = FakeConsole()
+    renderer = AgentRenderer(console, stream_lag_tokens=0, stream_cadence=0)
+
+    renderer.feed('{"type":"assistant","message":{"content":[{"type":"tool_use","name":"Read","input":{"file_path":"a.py"}}]}}')
+    ticker = renderer._ticker
+    renderer.feed('{"type":"assistant","message":{"content":[{"type":"tool_use","name":"Read","input":{"file_path":"b.py"}}]}}')
+
+    assert renderer._ticker is ticker
+    assert "Read: a.py" in console.lines[0]
+
+    renderer.finish()
+
+    assert renderer._ticker is None
+    assert "Read: b.py" in console.lines[1]
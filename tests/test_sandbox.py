@@ -1,7 +1,7 @@
 from types import SimpleNamespace
 
 from ftl.sandbox import create_sandbox
-from ftl.sandbox.docker import DockerSandbox
+from ftl.sandbox.docker import DockerSandbox, _DIFF_SCRIPT_PATH
 
 
 def test_create_sandbox_keeps_selected_agent():
@@ -28,3 +28,228 @@ def test_docker_sandbox_prewarms_selected_agent(monkeypatch):
     sandbox._prewarm_agent()
 
     assert calls == [["docker", "exec", "-u", "ftl", "container123", "sh", "-c", "codex --version"]]
+
+
+def test_docker_sandbox_write_file_pipes_bytes_over_stdin(monkeypatch):
+    calls = []
+    sandbox = DockerSandbox(image="image")
+    sandbox.container_id = "container123"
+
+    def fake_run(cmd, input=None, capture_output=True):
+        calls.append((cmd, input))
+        return SimpleNamespace(returncode=0, stderr=b"")
+
+    monkeypatch.setattr("ftl.sandbox.docker.subprocess.run", fake_run)
+
+    before = sandbox.workspace_generation()
+    assert sandbox.write_file("/workspace/_ftl_test.py", b"x = 'FTLEOF'\n") == (0, "", "")
+
+    cmd, data = calls[0]
+    assert cmd[:4] == ["docker", "exec", "-i", "container123"]
+    assert cmd[-1] == "/workspace/_ftl_test.py"
+    assert data == b"x = 'FTLEOF'\n"
+    assert sandbox.workspace_generation() == before + 1
+
+
+def test_docker_sandbox_exec_stream_caps_buffered_output(monkeypatch):
+    lines = [f"line {i}\n" for i in range(1000)]
+    streamed = []
+
+    class FakeProc:
+        stdout = iter(lines)
+        returncode = 0
+
+        def wait(self):
+            return 0
+
+    monkeypatch.setattr("ftl.sandbox.docker.subprocess.Popen", lambda *args, **kwargs: FakeProc())
+    monkeypatch.setattr("ftl.sandbox.docker._STREAM_BUFFER_CAP", 200)
+    sandbox = DockerSandbox(image="image")
+    sandbox.container_id = "container123"
+
+    code, stdout, _ = sandbox.exec_stream("agent", callback=streamed.append)
+
+    assert code == 0
+    assert streamed == lines
+    assert stdout.startswith("line 0\n")
+    assert stdout.endswith("line 999\n")
+    assert "lines truncated" in stdout
+    assert len(stdout) < 300
+
+
+def test_docker_sandbox_get_diff_reads_tar_stream(monkeypatch, tmp_path):
+    import io
+    import json
+    import tarfile
+
+    snapshot = tmp_path / "snap123"
+    snapshot.mkdir()
+    (snapshot / "app.py").write_text("old\n")
+    (snapshot / "gone.py").write_text("bye\n")
+
+    stream = io.BytesIO()
+    with tarfile.open(fileobj=stream, mode="w|") as tar:
+        changes = [
+            {"path": "gone.py", "deleted": True},
+            {"path": "new.py", "deleted": False, "exists_in_snapshot": False},
+            {"path": "app.py", "deleted": False, "exists_in_snapshot": True},
+        ]
+        for name, data in [("new.py", b"fresh\n"), ("app.py", b"new\n"),
+                           (".ftl_diff", json.dumps(changes).encode())]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    data = stream.getvalue()
+
+    class FakeProc:
+        def __init__(self):
+            self.stdout = io.BytesIO(data)
+
+        def wait(self):
+            return 0
+
+    calls = []
+    sandbox = DockerSandbox(image="image")
+    sandbox.container_id = "container123"
+    monkeypatch.setattr(
+        "ftl.sandbox.docker.subprocess.Popen", lambda cmd, **kw: calls.append(cmd) or FakeProc()
+    )
+
+    diffs = {d["path"]: d for d in sandbox.get_diff(snapshot)}
+
+    assert diffs["gone.py"]["status"] == "deleted"
+    assert diffs["new.py"]["_content_bytes"] == b"fresh\n"
+    assert diffs["app.py"]["status"] == "modified"
+    assert diffs["app.py"]["_content_bytes"] == b"new\n"
+
+    # The script is installed on the first call only; later calls just run it.
+    sandbox.get_diff(snapshot)
+    assert "PYEOF" in calls[0][-1]
+    assert calls[1][-1] == f"python3 {_DIFF_SCRIPT_PATH} snap123"
+
+
+def test_docker_sandbox_skips_fingerprint_while_watcher_is_live(monkeypatch, tmp_path):
+    import io
+    import tarfile
+
+    snapshot = tmp_path / "snap123"
+    snapshot.mkdir()
+
+    def listing(name):
+        stream = io.BytesIO()
+        with tarfile.open(fileobj=stream, mode="w|") as tar:
+            info = tarfile.TarInfo(name)
+            info.size = 2
+            tar.addfile(info, io.BytesIO(b"[]"))
+        return stream.getvalue()
+
+    class FakeProc:
+        def __init__(self, data):
+            self.stdout = io.BytesIO(data)
+
+        def wait(self):
+            return 0
+
+    runs = []
+    sandbox = DockerSandbox(image="image")
+    sandbox.container_id = "container123"
+    monkeypatch.setattr(
+        "ftl.sandbox.docker.subprocess.run",
+        lambda cmd, **kw: runs.append(cmd) or SimpleNamespace(returncode=0, stdout=b"app.py\t3\t1.0\n"),
+    )
+
+    monkeypatch.setattr("ftl.sandbox.docker.subprocess.Popen",
+                        lambda cmd, **kw: FakeProc(listing(".ftl_diff.hinted")))
+    sandbox.get_diff(snapshot)
+    assert sandbox.workspace_fingerprint() is None
+    assert runs == []
+
+    # Watcher gone (full walk): fall back to the find fingerprint.
+    monkeypatch.setattr("ftl.sandbox.docker.subprocess.Popen",
+                        lambda cmd, **kw: FakeProc(listing(".ftl_diff")))
+    sandbox.get_diff(snapshot)
+    assert sandbox.workspace_fingerprint() is not None
+    assert "find /workspace" in runs[0][-1]
+
+
+def test_docker_sandbox_alive_ids_checks_all_containers_in_one_inspect(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, capture_output=True, text=True):
+        calls.append(cmd)
+        return SimpleNamespace(returncode=1, stdout="abc123full true\ndef456full false\n")
+
+    monkeypatch.setattr("ftl.sandbox.docker.subprocess.run", fake_run)
+
+    sandbox = DockerSandbox(image="image")
+    assert sandbox._alive_ids("abc123", "def456", "gone789", None) == {"abc123"}
+    assert len(calls) == 1
+    assert calls[0][-3:] == ["abc123", "def456", "gone789"]
+
+
+def test_docker_sandbox_exec_reuses_one_persistent_shell(monkeypatch, tmp_path):
+    import subprocess
+
+    spawned = []
+    real_popen = subprocess.Popen
+
+    def fake_popen(cmd, **kwargs):
+        spawned.append(cmd)
+        return real_popen(["sh"], **kwargs)  # stand-in for `docker exec -i <id> sh`
+
+    monkeypatch.setattr("ftl.sandbox.docker.subprocess.Popen", fake_popen)
+
+    sandbox = DockerSandbox(image="image")
+    sandbox.container_id = "container123"
+    try:
+        assert sandbox.exec("echo out; echo err >&2; exit 3") == (3, "out\n", "err\n")
+        assert sandbox.exec("printf partial") == (0, "partial", "")
+        assert sandbox.exec("sleep 5", timeout=0.2)[0] == 124
+        assert sandbox.exec("echo again") == (0, "again\n", "")
+        # A shell that dies mid-command is not retried: the command may have run.
+        log = tmp_path / "log"
+        assert sandbox.exec(f"echo once >> {log}; kill -9 $$")[0] == 1
+        assert log.read_text() == "once\n"
+    finally:
+        sandbox._drop_shell()
+
+    assert spawned == [["docker", "exec", "-i", "container123", "sh"]] * 2
+
+
+def test_docker_sandbox_warm_pool_hands_out_newest_caps_size_and_refills(monkeypatch):
+    import time
+    from collections import defaultdict, deque
+
+    removed = []
+    monkeypatch.setattr(DockerSandbox, "_standby_pool", defaultdict(deque))
+    monkeypatch.setattr(DockerSandbox, "_reaper", object())  # no reaper thread
+    monkeypatch.setattr(
+        "ftl.sandbox.docker.subprocess.run",
+        lambda cmd, **kw: removed.extend(cmd[3:]) or SimpleNamespace(returncode=0),
+    )
+    monkeypatch.setattr("ftl.sandbox.docker._check_image_exists", lambda image: None)
+    monkeypatch.setattr(DockerSandbox, "_alive_ids", lambda self, *ids: set(ids))
+    monkeypatch.setattr(DockerSandbox, "_init_workspace", lambda self, *a, **kw: None)
+    monkeypatch.setattr(DockerSandbox, "_prewarm_agent", lambda self: None)
+    monkeypatch.setattr(DockerSandbox, "_start_pytest_server", lambda self: None)
+    monkeypatch.setattr(DockerSandbox, "_create", lambda self: "warm1")
+
+    for cid in ("c1", "c2", "c3"):
+        sandbox = DockerSandbox(image="image")
+        sandbox.container_id = cid
+        sandbox.standby()
+
+    assert removed == ["c1"]
+    first, second = DockerSandbox(image="image"), DockerSandbox(image="image")
+    assert first.boot("/tmp/snap") == "c3"
+    assert second.boot("/tmp/snap") == "c2"
+    assert not first.fresh and not second.fresh
+
+    # Emptying the pool starts a replacement, handed out as a fresh container.
+    for _ in range(100):
+        if DockerSandbox._standby_pool[(None, "image")]:
+            break
+        time.sleep(0.01)
+    third = DockerSandbox(image="image")
+    assert third.boot("/tmp/snap") == "warm1"
+    assert third.fresh
@@ -34,12 +34,22 @@ class FakeAgent:
 
 
 class FakeSandbox:
-    def __init__(self, diffs):
+    def __init__(self, diffs, generation=None, fingerprint=None):
         self.diffs = list(diffs)
+        self.generation = generation
+        self.fingerprint = fingerprint
+        self.diff_calls = 0
 
     def get_diff(self, snapshot_path):
+        self.diff_calls += 1
         return list(self.diffs)
 
+    def workspace_generation(self):
+        return self.generation
+
+    def workspace_fingerprint(self):
+        return self.fingerprint
+
 
 def test_session_follow_up_passes_agent_context(monkeypatch):
     stream = io.StringIO()
@@ -53,6 +63,8 @@ def test_session_follow_up_passes_agent_context(monkeypatch):
     session.history = ["Build a login form."]
     session.snapshot_path = "/tmp/snapshot"
     session.diffs = []
+    session._diff_cache = {}
+    session._diff_fingerprint = None
     session._review = {"summary": "old review"}
     session._agent_context = lambda: {
         "history": ["Build a login form."],
@@ -87,6 +99,8 @@ def test_session_follow_up_reports_no_file_changes(monkeypatch):
     session.history = ["Build a login form."]
     session.snapshot_path = "/tmp/snapshot"
     session.diffs = []
+    session._diff_cache = {}
+    session._diff_fingerprint = None
     session._review = {"summary": "old review"}
     session._agent_context = lambda: {
         "history": ["Build a login form."],
@@ -98,3 +112,41 @@ def test_session_follow_up_reports_no_file_changes(monkeypatch):
     Session.follow_up(session, "Run the app.")
 
     assert "No file changes from that instruction." in stream.getvalue()
+
+
+def test_get_diffs_reuses_cache_until_workspace_generation_changes():
+    session = Session.__new__(Session)
+    session.sandbox = FakeSandbox([{"path": "app.py", "status": "created", "lines": []}], generation=1)
+    session.snapshot_path = "/tmp/snapshot"
+    session.diffs = None
+    session._diff_cache = {}
+    session._diff_fingerprint = None
+
+    first = Session._get_diffs(session)
+    second = Session._get_diffs(session)
+    assert first == second
+    assert session.sandbox.diff_calls == 1
+
+    session.sandbox.generation = 2
+    Session._get_diffs(session)
+    assert session.sandbox.diff_calls == 2
+
+
+def test_get_diffs_skips_rediff_when_fingerprint_is_unchanged():
+    session = Session.__new__(Session)
+    session.sandbox = FakeSandbox([{"path": "app.py", "status": "created", "lines": []}],
+                                  generation=1, fingerprint="abc")
+    session.snapshot_path = "/tmp/snapshot"
+    session.diffs = None
+    session._diff_cache = {}
+    session._diff_fingerprint = None
+
+    Session._get_diffs(session)
+    session.sandbox.generation = 2
+    Session._get_diffs(session)
+    assert session.sandbox.diff_calls == 1
+
+    session.sandbox.generation = 3
+    session.sandbox.fingerprint = "def"
+    Session._get_diffs(session)
+    assert session.sandbox.diff_calls == 2
@@ -29,3 +29,22 @@ def test_snapshot_create_writes_manifest_and_restore_skips_it(monkeypatch, tmp_p
     assert (restore_target / "nested" / "data.txt").read_text() == "hello\n"
     assert not (restore_target / ".ftl_manifest").exists()
     assert not (restore_target / ".ftl_meta").exists()
+
+
+def test_snapshot_restore_copies_tree_without_metadata(monkeypatch, tmp_path):
+    snapshots_dir = tmp_path / "snapshots"
+    monkeypatch.setattr(local_mod, "SNAPSHOT_DIR", snapshots_dir)
+    snapshot_path = snapshots_dir / "abc12345"
+    (snapshot_path / "nested").mkdir(parents=True)
+    (snapshot_path / "app.py").write_text("print('hi')\n")
+    (snapshot_path / "nested" / "data.txt").write_text("hello\n")
+    (snapshot_path / ".ftl_meta").write_text(str(tmp_path / "project"))
+    (snapshot_path / ".ftl_manifest").write_text("app.py\t12\t0")
+
+    restore_target = tmp_path / "restore"
+    LocalSnapshotStore().restore("abc12345", restore_target)
+
+    assert (restore_target / "app.py").read_text() == "print('hi')\n"
+    assert (restore_target / "nested" / "data.txt").read_text() == "hello\n"
+    assert not (restore_target / ".ftl_manifest").exists()
+    assert not (restore_target / ".ftl_meta").exists()